@@ -0,0 +1,120 @@
+# This file contains the functions that are used by the python scripts in
+# the subfolders to read and summarize the benchmark files of snakemake
+# (the benchmark directive of a rule)
+
+import os
+import numpy as np
+import pandas as pd
+
+
+# columns of the benchmark files that are summarized
+SUMMARY_COLUMNS = ["s", "cpu_time", "max_rss", "max_uss", "io_in", "io_out"]
+
+
+def read_benchmark(path):
+    """
+    Reads a benchmark file of snakemake, with one row per repeat of the
+    rule. Older versions of snakemake do not write the cpu_time column,
+    then it is calculated from the mean CPU load (in percent of one core)
+    and the wall clock time.
+    """
+    df = pd.read_csv(path, sep="\t")
+    if "cpu_time" not in df.columns:
+        df["cpu_time"] = df["mean_load"] * df["s"] / 100
+    return df
+
+
+def summarize_benchmark(df, columns=SUMMARY_COLUMNS):
+    """
+    Returns the median of the repeats for every column, as a dict, and
+    the number of repeats
+    """
+    summary = {column: df[column].median() for column in columns
+               if column in df.columns}
+    summary["repeats"] = len(df)
+    return summary
+
+
+def benchmark_path(benchmark_dir, *parts):
+    """ Returns the path of a benchmark file, or None if it does not exist """
+    path = os.path.join(benchmark_dir, *parts)
+    return path if os.path.isfile(path) else None
+
+
+def median_ci(values, nbootstrap=10000, alpha=0.05, seed=0):
+    """
+    Returns a percentile bootstrap confidence interval of the median, as
+    lower and upper bound
+    """
+    values = np.asarray(values, dtype=float)
+    rng = np.random.default_rng(seed)
+    medians = np.median(
+        rng.choice(values, (nbootstrap, len(values))), axis=1)
+    lower, upper = np.quantile(medians, [alpha / 2, 1 - alpha / 2])
+    return lower, upper
+
+
+def robust_summary(values, nbootstrap=10000, alpha=0.05, seed=0):
+    """
+    Summarizes repeated measurements by the median, the median absolute
+    deviation (MAD) and a bootstrap confidence interval of the median,
+    which are not pulled by a single slow outlier like the mean and the
+    standard deviation. Returns a dict.
+    """
+    values = np.asarray(values, dtype=float)
+    values = values[~np.isnan(values)]
+    if len(values) == 0:
+        return {"count": 0}
+    median = np.median(values)
+    lower, upper = median_ci(values, nbootstrap, alpha, seed)
+    return {
+        "count": len(values),
+        "median": median,
+        "mad": np.median(np.abs(values - median)),
+        "ci_lower": lower,
+        "ci_upper": upper,
+        "min": values.min(),
+        "max": values.max(),
+        }
+
+
+def find_benchmarks(benchmark_dir):
+    """
+    Returns the paths of all benchmark files below a directory, as a dict
+    of the path relative to the directory and the path
+    """
+    paths = {}
+    for dirpath, _, filenames in os.walk(benchmark_dir):
+        for filename in filenames:
+            if filename.endswith(".tsv"):
+                path = os.path.join(dirpath, filename)
+                paths[os.path.relpath(path, benchmark_dir)] = path
+    return paths
+
+
+def tool_of(relpath):
+    """
+    Returns the tool of a benchmark file from its path relative to the
+    benchmark directory: the directory of the file ({tool}/*.tsv, also
+    threads/{tool}/*.tsv), or the file name for files directly in the
+    benchmark directory ({tool}.tsv)
+    """
+    dirname, filename = os.path.split(relpath)
+    if dirname:
+        return os.path.basename(dirname)
+    return os.path.splitext(filename)[0]
+
+
+def group_of(relpath):
+    """
+    Returns the group of a benchmark file from its path relative to the
+    benchmark directory: the relative directory of the file, or the file
+    name for files directly in the benchmark directory ({tool}.tsv). The
+    benchmarks of a tool in different sweeps (e.g. {tool}.tsv, 
+    {tool}/*.tsv, threads/{tool}/*.tsv and nfrags/{tool}/*.tsv) are in 
+    different groups.
+    """
+    dirname = os.path.dirname(relpath)
+    if dirname:
+        return dirname.replace(os.sep, "/")
+    return relpath
@@ -0,0 +1,302 @@
+#!/usr/bin/python3
+
+"""
+Micro-benchmarks of the hot functions of the evaluation scripts (reading
+the fasta and fastq files, cleaning up the merged reads, the edit
+distances and the phred counts), on synthetic input of several sizes in
+the header style of every merging tool (see synthetic.py). Needs none of
+the merging tools.
+
+Every result is appended to a JSON lines file together with the git
+commit, so that the results of different commits can be compared: for
+every benchmark, the change against the latest result of another commit
+is printed.
+
+    python3 benchmarks/run.py --sizes 1000 10000 --filter common.
+"""
+
+
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+BASEDIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.append(BASEDIR)
+import common
+import alignment
+import kernels
+import synthetic
+
+
+SEPERATOR = b'-'
+
+# name: (function, whether it runs for every tool or only for one)
+BENCHMARKS = {}
+
+
+def benchmark(name, per_tool=False):
+    """
+    Registers a benchmark. The function gets the dataset and returns two
+    functions: setup, which is called before every repeat and is not
+    timed, and run, which gets the result of setup and is timed.
+    """
+    def decorator(function):
+        BENCHMARKS[name] = (function, per_tool)
+        return function
+    return decorator
+
+
+def _load_script(path):
+    """ Imports one of the python scripts in the subfolders """
+    spec = importlib.util.spec_from_file_location(
+        os.path.basename(os.path.dirname(path)).replace("-", "_"), path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _no_setup():
+    return None
+
+
+class Dataset:
+    """ Synthetic input files of one size and tool, loaded on demand """
+
+    def __init__(self, directory, size, tool_name):
+        self.size = size
+        self.tool_name = tool_name
+        self.fasta_path, self.fastq_path = synthetic.make_dataset(
+            directory, size, tool_name)
+
+    def merged_reads(self):
+        """ Template IDs, template sequences and merged reads """
+        template_ids, template_seqs = common.load_fasta_ids(self.fasta_path)
+        read_ids, reads = common.load_merged_reads(
+            self.fastq_path, template_ids, SEPERATOR, self.tool_name,
+            fields=('sequence', 'quality'))
+        return read_ids, reads, template_seqs
+
+
+# Benchmarks ------------------------------------------------------------------
+
+
+@benchmark("common.load_fasta")
+def bench_load_fasta(data):
+    return _no_setup, lambda _: common.load_fasta(data.fasta_path)
+
+
+@benchmark("common.load_fasta_ids")
+def bench_load_fasta_ids(data):
+    return _no_setup, lambda _: common.load_fasta_ids(data.fasta_path)
+
+
+@benchmark("common.load_fastq", per_tool=True)
+def bench_load_fastq(data):
+    return _no_setup, lambda _: common.load_fastq(data.fastq_path)
+
+
+@benchmark("common.clean_merged_reads", per_tool=True)
+def bench_clean_merged_reads(data):
+    reads = common.load_fastq(data.fastq_path)
+    templates = common.load_fasta(data.fasta_path)
+    # clean_merged_reads changes the names of the reads
+    return (lambda: [dict(read) for read in reads],
+            lambda reads: common.clean_merged_reads(
+                reads, templates, SEPERATOR, data.tool_name))
+
+
+@benchmark("common.load_merged_reads", per_tool=True)
+def bench_load_merged_reads(data):
+    template_ids, _ = common.load_fasta_ids(data.fasta_path)
+    return _no_setup, lambda _: common.load_merged_reads(
+        data.fastq_path, template_ids, SEPERATOR, data.tool_name)
+
+
+def _bench_edit_distances(data, aligner):
+    read_ids, reads, template_seqs = data.merged_reads()
+    templates = [template_seqs[i] for i in read_ids.tolist()]
+    read_seqs = [read['sequence'] for read in reads]
+    return _no_setup, lambda _: alignment.get_edit_distances(
+        templates, read_seqs, aligner=aligner)
+
+
+@benchmark("alignment.get_edit_distances[edlib]")
+def bench_edit_distances_edlib(data):
+    return _bench_edit_distances(data, "edlib")
+
+
+@benchmark("alignment.get_edit_distances[myers]")
+def bench_edit_distances_myers(data):
+    return _bench_edit_distances(data, "myers")
+
+
+def _bench_process_merged_reads(data, numba):
+    phred = _load_script(os.path.join(BASEDIR, "phred_accuracy", 
+                                      "evaluate.py"))
+    process = (phred._process_merged_reads_numba if numba
+               else phred._process_merged_reads_python)
+    read_ids, reads, template_seqs = data.merged_reads()
+    return _no_setup, lambda _: process(read_ids, reads, template_seqs)
+
+
+@benchmark("phred_accuracy.process_merged_reads[python]")
+def bench_process_merged_reads_python(data):
+    return _bench_process_merged_reads(data, False)
+
+
+@benchmark("phred_accuracy.process_merged_reads[numba]")
+def bench_process_merged_reads_numba(data):
+    return _bench_process_merged_reads(data, True)
+
+
+# Runner ----------------------------------------------------------------------
+
+
+def parse_arguments():
+    """Parses the arguments and returns them as a list"""
+    parser = argparse.ArgumentParser(
+        description="Runs the micro-benchmarks of the evaluation code and "
+                    "appends the results to a JSON lines file.")
+    parser.add_argument(
+        "-n", "--sizes", action="store", type=int, nargs="+",
+        default=[1000, 10000, 100000],
+        help="Numbers of templates (default: 1000 10000 100000)")
+    parser.add_argument(
+        "-t", "--tools", action="store", type=str, nargs="+",
+        dest="tool_names", default=list(synthetic.TOOL_HEADERS),
+        choices=list(synthetic.TOOL_HEADERS),
+        help="Header styles of the benchmarks that depend on the tool "
+             "(default: all)")
+    parser.add_argument(
+        "-f", "--filter", action="store", type=str, default="",
+        help="Only run the benchmarks whose name contains this string")
+    parser.add_argument(
+        "-r", "--repeats", action="store", type=int, default=5,
+        help="Number of timed repeats of every benchmark (default: 5)")
+    parser.add_argument(
+        "-o", "--out", action="store", type=str, dest="results_path",
+        default=os.path.join(BASEDIR, "benchmarks", "results.jsonl"),
+        help="JSON lines file that the results are appended to "
+             "(default: benchmarks/results.jsonl)")
+    parser.add_argument(
+        "-d", "--data", action="store", type=str, dest="data_dir",
+        help="Directory for the synthetic input, which is reused by later "
+             "runs (default: a temporary directory)")
+    args = parser.parse_args()
+    return [args.sizes, args.tool_names, args.filter, args.repeats,
+            args.results_path, args.data_dir]
+
+
+def git_commit():
+    """ Returns the current commit and whether the work tree is dirty """
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=BASEDIR, capture_output=True,
+            text=True, check=True).stdout.strip()
+        status = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            cwd=BASEDIR, capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, bool(status.strip())
+
+
+def time_benchmark(setup, run, repeats):
+    """ Returns the times of the repeats of run, in seconds """
+    times = []
+    for _ in range(repeats):
+        args = setup()
+        start = time.perf_counter()
+        run(args)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def load_results(path):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def previous_result(results, result):
+    """
+    Returns the latest result of the same benchmark, tool and size from
+    another commit, or None
+    """
+    for previous in reversed(results):
+        if (previous["benchmark"] == result["benchmark"]
+                and previous["tool"] == result["tool"]
+                and previous["size"] == result["size"]
+                and previous["commit"] != result["commit"]):
+            return previous
+    return None
+
+
+def main(sizes, tool_names, filter_string="", repeats=5,
+         results_path="results.jsonl", data_dir=None):
+
+    commit, dirty = git_commit()
+    previous_results = load_results(results_path)
+    tmpdir = None
+    if data_dir is None:
+        tmpdir = tempfile.TemporaryDirectory(prefix="benchmarks_")
+        data_dir = tmpdir.name
+    os.makedirs(data_dir, exist_ok=True)
+
+    with open(results_path, 'a') as out:
+        for name, (function, per_tool) in BENCHMARKS.items():
+            if filter_string not in name:
+                continue
+            if "[numba]" in name and not kernels.NUMBA_AVAILABLE:
+                print(f"{name}: skipped, numba is not installed")
+                continue
+            for size in sizes:
+                for tool_name in (tool_names if per_tool
+                                  else tool_names[:1]):
+                    data = Dataset(data_dir, size, tool_name)
+                    setup, run = function(data)
+                    # once untimed, e.g. to compile the numba kernels
+                    run(setup())
+                    times = time_benchmark(setup, run, repeats)
+                    result = {
+                        "benchmark": name,
+                        "tool": tool_name if per_tool else None,
+                        "size": size,
+                        "repeats": repeats,
+                        "min_s": min(times),
+                        "median_s": float(np.median(times)),
+                        "items_per_s": size / min(times),
+                        "commit": commit,
+                        "dirty": dirty,
+                        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                        "host": platform.node(),
+                        "python": platform.python_version(),
+                        "numba": kernels.NUMBA_AVAILABLE,
+                        }
+                    out.write(json.dumps(result) + "\n")
+                    out.flush()
+
+                    line = (f"{name:48} {result['tool'] or '':16} "
+                            f"{size:>9} {result['min_s']:10.4f} s")
+                    previous = previous_result(previous_results, result)
+                    if previous is not None:
+                        change = result["min_s"] / previous["min_s"] - 1
+                        line += (f" {change:+7.1%} vs "
+                                 f"{(previous['commit'] or '')[:8]}")
+                    print(line)
+
+    if tmpdir is not None:
+        tmpdir.cleanup()
+
+
+if __name__ == "__main__":
+
+    args = parse_arguments()
+    main(*args)
@@ -0,0 +1,111 @@
+# This file contains the generator of the synthetic input of the
+# micro-benchmarks: templates with fragSim-like names and merged reads
+# with the header style of each merging tool (see
+# common.HEADER_PREFIX_LENGTHS). The same seed always gives the same
+# files, so benchmark results of different commits are comparable.
+
+import gzip
+import os
+import numpy as np
+
+
+ALPHABET = np.frombuffer(b'ACGT', dtype=np.uint8)
+
+# prefix in front of the template name in the header of a merged read,
+# and whether the tool also writes unmerged reads (@F_/@R_) into the
+# same file
+TOOL_HEADERS = {
+    "AdapterRemoval": (b'@M_', True),
+    "ClipAndMerge": (b'@M_', True),
+    "leeHom": (b'@', False),
+    "seqtk_adna_trim": (b'@', False),
+    "bbmerge": (b'@', False),
+    "fastp": (b'@', False),
+    "SeqPrep": (b'@', False),
+    }
+
+
+def make_templates(ntemplates, seed=0, min_len=30, max_len=150):
+    """
+    Returns the names and sequences of random templates, with lengths
+    that are uniformly distributed between min_len and max_len
+    """
+    rng = np.random.default_rng(seed)
+    lengths = rng.integers(min_len, max_len + 1, ntemplates)
+    chroms = rng.integers(1, 23, ntemplates)
+    starts = rng.integers(0, 2**28, ntemplates)
+    seqs = rng.choice(ALPHABET, lengths.sum()).tobytes()
+    ends = np.cumsum(lengths)
+    names, templates = [], []
+    for chrom, start, length, end in zip(chroms.tolist(), starts.tolist(),
+                                         lengths.tolist(), ends.tolist()):
+        names.append(b"chr%d:%d-%d" % (chrom, start, length))
+        templates.append(seqs[end-length:end])
+    return names, templates
+
+
+def make_merged_reads(names, templates, tool_name, seed=0,
+                      merged_fraction=0.9, error_rate=0.01,
+                      unmerged_fraction=0.05):
+    """
+    Returns the fastq entries (header, sequence, quality) of merged reads
+    of the templates, in the header style of the tool. A merged_fraction
+    of the templates is merged, with substitution errors at error_rate
+    and sometimes a base more or less at the end. Tools that write
+    unmerged reads into the same file get unmerged_fraction of them.
+    """
+    prefix, unmerged = TOOL_HEADERS[tool_name]
+    rng = np.random.default_rng(seed)
+    reads = []
+    for name, template in zip(names, templates):
+        if rng.random() >= merged_fraction:
+            continue
+        seq = bytearray(template)
+        for i in np.flatnonzero(rng.random(len(seq)) < error_rate).tolist():
+            seq[i] = ALPHABET[rng.integers(4)]
+        indel = rng.random()
+        if indel < 0.02:
+            seq = seq[:-1]
+        elif indel < 0.04:
+            seq.append(ALPHABET[rng.integers(4)])
+        quality = bytes(rng.integers(35, 75, len(seq), dtype=np.uint8))
+        reads.append((prefix + name + b'-1', bytes(seq), quality))
+        if unmerged and rng.random() < unmerged_fraction:
+            for mate in (b'@F_', b'@R_'):
+                reads.append((mate + name + b'-1', template[:50],
+                              quality[:50]))
+    return reads
+
+
+def write_fasta(path, names, templates):
+    with open(path, 'wb') as f:
+        for name, template in zip(names, templates):
+            f.write(b">%s\n%s\n" % (name, template))
+
+
+def write_fastq(path, reads):
+    """ Writes a gzipped fastq file if the path ends with .gz """
+    f = gzip.open(path, 'wb', compresslevel=1) if path.endswith(".gz") \
+        else open(path, 'wb')
+    for header, seq, quality in reads:
+        f.write(b"%s\n%s\n+\n%s\n" % (header, seq, quality))
+    f.close()
+
+
+def make_dataset(directory, ntemplates, tool_name, seed=0, gzipped=False):
+    """
+    Writes the templates and the merged reads of a tool to the directory,
+    unless they are already there. Returns the paths of the fasta and the
+    fastq file.
+    """
+    fasta_path = os.path.join(directory, f"n{ntemplates}_s{seed}.fa")
+    fastq_path = os.path.join(
+        directory, f"n{ntemplates}_s{seed}_{tool_name}.fq"
+        + (".gz" if gzipped else ""))
+    if not os.path.exists(fasta_path) or not os.path.exists(fastq_path):
+        names, templates = make_templates(ntemplates, seed)
+        if not os.path.exists(fasta_path):
+            write_fasta(fasta_path, names, templates)
+        write_fastq(fastq_path, make_merged_reads(names, templates,
+                                                  tool_name, seed))
+    return fasta_path, fastq_path
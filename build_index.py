@@ -0,0 +1,77 @@
+#!/usr/bin/python3
+
+"""
+Builds an on-disk name index (see common.build_index) for a simulated
+template fasta file or a fastq file of merged reads, and looks up
+single reads in it.
+"""
+
+
+import argparse
+import common
+
+
+def parse_arguments():
+    """
+    """
+    parser = argparse.ArgumentParser(
+        description="Builds a name-to-offset index for a gzipped or "
+                    "unzipped fasta/fastq file, or looks up reads by name "
+                    "if the index already exists.")
+
+    # required arguments
+    parser.add_argument(
+        "-i", "--in", action="store", type=str, required=True,
+        dest="path", help='gzipped or unzipped fasta file of the templates '
+                          'or fastq file of the merged reads')
+
+    # optional arguments
+    parser.add_argument(
+        "-o", "--index", action="store", type=str, required=False,
+        dest="index_path", help="Path of the index (default: input path "
+                                "+ .nidx)")
+    parser.add_argument(
+        "-s", "--seperator", action="store", type=str, default="-",
+        help="this character and all charaters to the right of it will be "
+             "removed from the fastq headers (default: -)")
+    parser.add_argument(
+        "-t", "--tool", action="store", type=str, required=False,
+        dest="tool_name", help="Name of the tool that produced the fastq "
+                               "file, selects how the headers are cleaned up")
+    parser.add_argument(
+        "-l", "--lookup", action="store", type=str, nargs="+",
+        required=False, dest="names", help="Print the records with these "
+                                           "names instead of building the "
+                                           "index")
+
+    args = parser.parse_args()
+    arguments = [
+        args.path,
+        args.index_path,
+        args.seperator.encode(),
+        args.tool_name,
+        args.names,
+        ]
+    return arguments
+
+
+def main(path, index_path, seperator, tool_name, names):
+    if index_path is None:
+        index_path = path + ".nidx"
+
+    if names is None:
+        common.build_index(path, index_path, seperator, tool_name)
+        return
+
+    for name in names:
+        offsets = common.lookup_index(index_path, name.encode())
+        if not offsets:
+            print(f"{name}: not found")
+        for lines in common.fetch_records(path, offsets):
+            print(b"\n".join(lines).decode())
+
+
+if __name__ == "__main__":
+
+    args = parse_arguments()
+    main(*args)
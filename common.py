@@ -1,7 +1,26 @@
 # This file contains functions that are commonly used by python scripts
 # in the subfolders  
 
+import argparse
+import concurrent.futures
+import cProfile
+import functools
 import gzip
+import heapq
+import json
+import itertools
+import math
+import mmap
+import os
+import shutil
+import sys
+import tempfile
+import time
+import zlib
+import numpy as np
+from multiprocessing import shared_memory
+import alignment
+import estimation
 
 
 def _is_gzipped(path):
@@ -14,6 +33,11 @@ def _is_gzipped(path):
         return f.read(2) == b'\x1f\x8b'
 
 
+def _open(path):
+    """ Opens a zipped or unzipped file in binary mode """
+    return gzip.open(path, 'rb') if _is_gzipped(path) else open(path, 'rb')
+
+
 def load_fasta(path):
     """
     Loads a zipped or unzipped fasta file.
@@ -34,32 +58,78 @@ def load_fasta(path):
     return templates
 
 
-def _process_fastq_entry(lines):
-    """ Returns a dict of the fastq entry """
-    keys = ['name', 'sequence', 'optional', 'quality']
-    read = {key: value for key, value in zip(keys, lines)}
-    return read
+def load_fasta_ids(path):
+    """
+    Loads a zipped or unzipped fasta file and assigns a dense integer ID
+    to every template, in the order of the file.
+    Returns a dict with the headers (without >) as keys and the IDs as
+    values, and a list with the sequences, indexed by the ID. In case of
+    duplicate templates, the name keeps the ID of its first occurence
+    and gets the sequence of its last one, just like in load_fasta.
+    """
+    template_ids = {}
+    sequences = []
+    f = _open(path)
+    progress = Progress(os.path.basename(path), f, "templates")
+    for header, sequence in progress.iter(zip(f, f)):
+        name = header.rstrip()[1:]
+        template_id = template_ids.setdefault(name, len(sequences))
+        if template_id == len(sequences):
+            sequences.append(sequence.rstrip())
+        else:
+            sequences[template_id] = sequence.rstrip()
+    f.close()
+    return template_ids, sequences
+
+
+FASTQ_FIELDS = ('name', 'sequence', 'optional', 'quality')
+
+
+def is_merged_read(header):
+    """
+    Header predicate for iter_fastq/load_fastq. Returns False for 
+    unmerged reads (header starting with @F_ or @R_).
+    """
+    return not header.startswith((b'@F_', b'@R_'))
+
+
+def _parse_fastq(f, keep, fields):
+    """ Yields the fastq entries of an open file, see iter_fastq """
+    positions = [FASTQ_FIELDS.index(field) for field in fields]
+    progress = Progress(os.path.basename(f.name), f, "reads")
+    for lines in progress.iter(zip(f, f, f, f)):
+        if keep is not None and not keep(lines[0]):
+            continue
+        yield {
+            field: lines[i].rstrip() for field, i in zip(fields, positions)
+            }
+
+
+def iter_fastq(path, keep=None, fields=FASTQ_FIELDS):
+    """
+    Iterates over a zipped or unzipped fastq file and yields a dict for
+    each fastq entry, with the requested fields (name, sequence, 
+    optional, quality) as keys. 
+    keep is an optional predicate that gets the raw header line of each
+    entry. Entries for which it returns False are skipped before any of
+    their lines are stripped or stored.
+    """
+    f = _open(path)
+    yield from _parse_fastq(f, keep, fields)
+    f.close()
 
 
-def load_fastq(path):
+def load_fastq(path, keep=None, fields=FASTQ_FIELDS):
     """
     Loads a zipped or unzipped fastq file.
     Returns a list of dicts. Each dict the following keys, one for each 
     line of a fastq entry: name, sequence, optional, quality. 
     There will likely be some reads that have the same name, in case of
     duplicate templates.
+    Entries can be filtered by their header and the fields can be 
+    limited to the ones that are needed, see iter_fastq.
     """
-    reads = []
-    f = gzip.open(path, 'rb') if _is_gzipped(path) else open(path, 'rb')
-    lines = []
-    for line in f:
-        lines.append(line.rstrip())
-        if len(lines) == 4:
-            # Create a dict of the fastq entry
-            reads.append(_process_fastq_entry(lines))
-            lines = []
-    f.close()
-    return reads
+    return list(iter_fastq(path, keep, fields))
 
 
 def _clean_up_fastq_header(header, seperator):
@@ -81,21 +151,1562 @@ def _clean_up_fastq_header(header, seperator):
     return clean_header
 
 
-def clean_merged_reads(reads, templates, seperator):
+def _make_header_normalizer(prefix_length, seperator):
+    """
+    Returns a function that cleans up a list of fastq headers at once,
+    for a tool that adds prefix_length characters (including the "@") 
+    in front of the template name. Like _clean_up_fastq_header, the 
+    characters from the end of the header up to the seperator are 
+    removed as well.
+    """
+    def normalize_headers(headers):
+        return [
+            header[prefix_length:].rsplit(seperator, 1)[0] 
+            for header in headers
+            ]
+    return normalize_headers
+
+
+# Number of characters that the merging tools add in front of the name 
+# of the original template in the header of a merged read
+HEADER_PREFIX_LENGTHS = {
+    "AdapterRemoval": len(b'@M_'),
+    "ClipAndMerge": len(b'@M_'),
+    "leeHom": len(b'@'),
+    "seqtk_adna_trim": len(b'@'),
+    "bbmerge": len(b'@'),
+    "fastp": len(b'@'),
+    "SeqPrep": len(b'@'),
+}
+
+
+def get_header_normalizer(tool_name, seperator):
+    """
+    Returns a function that cleans up a list of merged read headers of 
+    the given tool (see HEADER_PREFIX_LENGTHS). For unknown tools, 
+    every header is cleaned up with _clean_up_fastq_header.
+    """
+    if tool_name in HEADER_PREFIX_LENGTHS:
+        return _make_header_normalizer(
+            HEADER_PREFIX_LENGTHS[tool_name], seperator)
+    
+    def normalize_headers(headers):
+        return [_clean_up_fastq_header(header, seperator) 
+                for header in headers]
+    return normalize_headers
+
+
+def clean_merged_reads(reads, templates, seperator, tool_name=None):
     """
     - Removes unmerged reads (header starting with @F_ or @R_.) 
     - Cleans up the header by removes additions that is added to the
     header of original template by the trimming programs, such as 
     "@M_"/"@" at the start and something at the end of the header.
+    The headers are cleaned up with the normalizer of the tool, see
+    get_header_normalizer.
     - Removes reads that can not be assigned to a template 
     """
+    # discard unmerged reads
+    reads = [read for read in reads if is_merged_read(read["name"])]
+    # Clean up headers
+    normalize_headers = get_header_normalizer(tool_name, seperator)
+    names = normalize_headers([read["name"] for read in reads])
     merged_reads = []
-    for read in reads:
-        # discard unmerged reads
-        if not read["name"].startswith((b'@F_', b'@R_')):
-            # Clean up header
-            read["name"] = _clean_up_fastq_header(read["name"], seperator)
-            # discard reads that can not be assigned to a template
-            if templates.get(read["name"]) is not None:
-                merged_reads.append(read)
-    return merged_reads
\ No newline at end of file
+    for read, name in zip(reads, names):
+        # discard reads that can not be assigned to a template
+        if name in templates:
+            read["name"] = name
+            merged_reads.append(read)
+    return merged_reads
+
+
+def iter_merged_reads(path, template_ids, seperator, tool_name=None,
+                      fields=('sequence',), chunk_size=100000, offset=None):
+    """
+    Iterates over the merged reads of a zipped or unzipped fastq file in
+    chunks of chunk_size reads. Unmerged reads are skipped while parsing,
+    the headers are cleaned up with the normalizer of the tool (see 
+    get_header_normalizer) and translated into template IDs (see 
+    load_fasta_ids). Reads that can not be assigned to a template are
+    discarded.
+    Yields a numpy array with the template IDs and a list with a dict of
+    the requested fields for each read of the chunk.
+    If an offset is given, parsing starts at this byte position of the 
+    (unzipped) file, and every chunk is yielded together with the byte
+    position after its last read, where a later run can resume (see 
+    Checkpoint).
+    """
+    normalize_headers = get_header_normalizer(tool_name, seperator)
+    fastq_fields = ('name',) + tuple(field for field in fields 
+                                     if field != 'name')
+    f = _open(path)
+    if offset:
+        f.seek(offset)
+    reads = []
+    for read in _parse_fastq(f, is_merged_read, fastq_fields):
+        reads.append(read)
+        if len(reads) == chunk_size:
+            chunk = _assign_template_ids(reads, template_ids, 
+                                         normalize_headers, fields)
+            yield chunk if offset is None else chunk + (f.tell(),)
+            reads = []
+    if reads:
+        chunk = _assign_template_ids(reads, template_ids, normalize_headers, 
+                                     fields)
+        yield chunk if offset is None else chunk + (f.tell(),)
+    f.close()
+
+
+def _assign_template_ids(reads, template_ids, normalize_headers, fields):
+    """
+    Returns the template IDs of the reads and the reads that could be 
+    assigned to a template
+    """
+    names = normalize_headers([read['name'] for read in reads])
+    ids = []
+    assigned_reads = []
+    for read, name in zip(reads, names):
+        template_id = template_ids.get(name)
+        if template_id is not None:
+            if 'name' not in fields:
+                del read['name']
+            ids.append(template_id)
+            assigned_reads.append(read)
+    return np.array(ids, dtype=np.int64), assigned_reads
+
+
+def load_merged_reads(path, template_ids, seperator, tool_name=None,
+                      fields=('sequence',)):
+    """
+    Loads the merged reads of a zipped or unzipped fastq file, see 
+    iter_merged_reads. Returns a numpy array with the template IDs and a
+    list with a dict of the requested fields for each read.
+    """
+    ids = [np.empty(0, dtype=np.int64)]
+    reads = []
+    for chunk_ids, chunk_reads in iter_merged_reads(
+            path, template_ids, seperator, tool_name, fields):
+        ids.append(chunk_ids)
+        reads.extend(chunk_reads)
+    return np.concatenate(ids), reads
+
+
+def merge_counts(counts_1, counts_2):
+    """ Adds two arrays of counts indexed by value, of any lengths """
+    if len(counts_1) < len(counts_2):
+        counts_1, counts_2 = counts_2, counts_1
+    merged = np.array(counts_1, dtype=np.int64)
+    merged[:len(counts_2)] += counts_2
+    return merged
+
+
+def add_counts(counts, values):
+    """
+    Adds the number of occurences of each value (non-negative integers)
+    to the counts, an array indexed by value. Returns the counts, grown
+    if needed.
+    """
+    new_counts = np.bincount(values, minlength=len(counts))
+    new_counts[:len(counts)] += counts
+    return new_counts
+
+
+# Per-template result arrays ------------------------------------------------
+
+
+# The per-template results that are saved by the evaluators, and their 
+# data types. The arrays are indexed by template ID (see load_fasta_ids).
+TEMPLATE_ARRAYS = {
+    "merged": np.bool_,
+    "length": np.uint16,
+    "edit_distance": np.uint16,
+}
+# Edit distance of templates without a merged read
+NO_EDIT_DISTANCE = np.iinfo(np.uint16).max
+
+
+def template_arrays_memory(ntemplates):
+    """ Memory in bytes of the per-template arrays of ntemplates templates """
+    return ntemplates * sum(np.dtype(dtype).itemsize 
+                            for dtype in TEMPLATE_ARRAYS.values())
+
+
+class TemplateArrays:
+    """
+    The per-template results (see TEMPLATE_ARRAYS), allocated once for 
+    ntemplates templates: whether a template has a merged read, the 
+    length of the merged read and its edit distance to the template. 
+    Templates without a merged read have length 0 and edit distance 
+    NO_EDIT_DISTANCE. The results of the merged reads are written into 
+    the arrays chunk by chunk (see add), so that they need no more 
+    memory than the arrays themselves.
+    """
+
+    def __init__(self, ntemplates):
+        self.arrays = {
+            "merged": np.zeros(ntemplates, dtype=TEMPLATE_ARRAYS["merged"]),
+            "length": np.zeros(ntemplates, dtype=TEMPLATE_ARRAYS["length"]),
+            "edit_distance": np.full(ntemplates, NO_EDIT_DISTANCE, 
+                                     dtype=TEMPLATE_ARRAYS["edit_distance"]),
+        }
+
+    def add(self, template_ids, read_lengths, edit_distances):
+        """
+        Writes the lengths and edit distances of merged reads at their 
+        template IDs. Values that do not fit into an uint16 are capped. 
+        In case of duplicate templates, the last read is kept.
+        """
+        cap = NO_EDIT_DISTANCE - 1
+        self.arrays["merged"][template_ids] = True
+        self.arrays["length"][template_ids] = np.minimum(read_lengths, cap)
+        self.arrays["edit_distance"][template_ids] = np.minimum(
+            edit_distances, cap)
+
+
+class TemplateResults:
+    """
+    Collects the template IDs, lengths and edit distances of merged reads
+    chunk by chunk (with the add method of TemplateArrays), e.g. of one
+    bucket or chunk in a worker process, to be added to the 
+    TemplateArrays of the parent process afterwards
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def add(self, template_ids, read_lengths, edit_distances):
+        self.chunks.append((template_ids, read_lengths, edit_distances))
+
+    def get(self):
+        """ Returns the IDs, lengths and edit distances of all chunks """
+        if not self.chunks:
+            return (np.zeros(0, dtype=np.int64),) * 3
+        return tuple(np.concatenate(arrays) for arrays in zip(*self.chunks))
+
+
+def make_template_arrays(ntemplates, template_ids, read_lengths, 
+                         edit_distances):
+    """
+    Returns a dict with the per-template results of the merged reads, 
+    see TemplateArrays
+    """
+    template_arrays = TemplateArrays(ntemplates)
+    template_arrays.add(template_ids, read_lengths, edit_distances)
+    return template_arrays.arrays
+
+
+def save_template_arrays(prefix, arrays):
+    """ Saves each per-template array as {prefix}_{name}.npy """
+    for name, array in arrays.items():
+        np.save(f"{prefix}_{name}.npy", array)
+
+
+def load_template_arrays(prefix, mmap_mode='r'):
+    """
+    Loads the per-template arrays that were saved with the given prefix.
+    By default the arrays are memory-mapped read-only, so only the parts
+    that are accessed are read from disk.
+    """
+    return {
+        name: np.load(f"{prefix}_{name}.npy", mmap_mode=mmap_mode)
+        for name in TEMPLATE_ARRAYS
+        }
+
+
+# On-disk name index --------------------------------------------------------
+
+
+def _index_entries(path, seperator, tool_name):
+    """
+    Yields an index line (cleaned up name, tab, offset) for every record
+    of a zipped or unzipped fasta or fastq file. The offset is the
+    position of the record in the uncompressed file. Unmerged reads
+    (header starting with @F_ or @R_) are not indexed.
+    """
+    normalize_headers = get_header_normalizer(tool_name, seperator)
+    f = _open(path)
+    offset = 0
+    record_offset = 0
+    lines_per_record = None
+    lines = []
+    for line in f:
+        if not lines:
+            record_offset = offset
+            if lines_per_record is None:
+                lines_per_record = 2 if line.startswith(b'>') else 4
+        offset += len(line)
+        lines.append(line)
+        if len(lines) == lines_per_record:
+            header = lines[0].rstrip()
+            if lines_per_record == 2:
+                yield header[1:] + b'\t%d\n' % record_offset
+            elif not header.startswith((b'@F_', b'@R_')):
+                name = normalize_headers([header])[0]
+                yield name + b'\t%d\n' % record_offset
+            lines = []
+    f.close()
+
+
+def _write_sorted_chunk(entries, tmpdir):
+    """ Sorts the index lines and writes them to a temporary file """
+    entries.sort()
+    fd, chunk_path = tempfile.mkstemp(dir=tmpdir)
+    with os.fdopen(fd, 'wb') as f:
+        f.writelines(entries)
+    return chunk_path
+
+
+def build_index(path, index_path=None, seperator=b'-', tool_name=None, 
+                chunk_size=5000000):
+    """
+    Builds an on-disk index for a zipped or unzipped fasta or fastq 
+    file, similar to a samtools faidx index but keyed by the cleaned up 
+    read name (see get_header_normalizer, the seperator and tool_name 
+    are ignored for fasta files). Each line of the index holds the name and the offset 
+    of the record in the uncompressed file, seperated by a tab. 
+    The lines are sorted by name, so that single names can be looked up
+    by a binary search in the index file (see lookup_index). The 
+    sorting is done in chunks of chunk_size lines, so the index is 
+    never held in memory as a whole.
+    Returns the path of the index (default: path + ".nidx").
+    """
+    if index_path is None:
+        index_path = path + ".nidx"
+    tmpdir = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(index_path)))
+    chunk_paths = []
+    entries = []
+    for entry in _index_entries(path, seperator, tool_name):
+        entries.append(entry)
+        if len(entries) == chunk_size:
+            chunk_paths.append(_write_sorted_chunk(entries, tmpdir))
+            entries = []
+    chunk_paths.append(_write_sorted_chunk(entries, tmpdir))
+    chunks = [open(chunk_path, 'rb') for chunk_path in chunk_paths]
+    with open(index_path, 'wb') as f:
+        f.writelines(heapq.merge(*chunks))
+    for chunk, chunk_path in zip(chunks, chunk_paths):
+        chunk.close()
+        os.remove(chunk_path)
+    os.rmdir(tmpdir)
+    return index_path
+
+
+def _parse_index_line(line):
+    """ Returns the name and the offset of an index line """
+    name, offset = line.rstrip(b'\n').rsplit(b'\t', 1)
+    return name, int(offset)
+
+
+def _bisect_index(mm, name):
+    """
+    Returns the position of the first line in the memory-mapped index 
+    whose name is not smaller than the given name.
+    """
+    lo, hi = 0, len(mm)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        # move to the start of the line that contains mid
+        line_start = mm.rfind(b'\n', 0, mid) + 1
+        line_end = mm.find(b'\n', line_start)
+        line_name = mm[line_start:mm.rfind(b'\t', line_start, line_end)]
+        if line_name < name:
+            lo = line_end + 1
+        else:
+            hi = line_start
+    return lo
+
+
+def lookup_index(index_path, name):
+    """
+    Returns the offsets of all records with the given (cleaned up) name,
+    using a binary search in the index file. The list is empty if the 
+    name is not in the index, and has more than one offset in case of 
+    duplicate templates.
+    """
+    offsets = []
+    with open(index_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return offsets
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        mm.seek(_bisect_index(mm, name))
+        for line in iter(mm.readline, b''):
+            line_name, offset = _parse_index_line(line)
+            if line_name != name:
+                break
+            offsets.append(offset)
+        mm.close()
+    return offsets
+
+
+def fetch_records(path, offsets):
+    """
+    Reads the fasta or fastq records at the given offsets (taken from 
+    the index) of a zipped or unzipped file. Returns a list with the 
+    stripped lines of each record, in the order of the offsets. 
+    Note: a gzipped file can only be decompressed from its start, so 
+    random access to a gzipped file costs time proportional to the 
+    offset. The offsets are therefore visited in increasing order.
+    """
+    records = {}
+    f = _open(path)
+    for offset in sorted(set(offsets)):
+        f.seek(offset)
+        header = f.readline()
+        lines_per_record = 2 if header.startswith(b'>') else 4
+        lines = [header.rstrip()]
+        for _ in range(lines_per_record - 1):
+            lines.append(f.readline().rstrip())
+        records[offset] = lines
+    f.close()
+    return [records[offset] for offset in offsets]
+
+
+# Hash-partitioned join ----------------------------------------------------
+
+
+def estimate_template_memory(path, ntemplates, nsample=1000):
+    """
+    Estimates the memory in bytes that load_fasta_ids needs for 
+    ntemplates templates, from the sizes of the names and sequences of
+    the first nsample templates of the fasta file
+    """
+    # dict entry, ID and list entry of each template
+    overhead = 140
+    f = _open(path)
+    sizes = [
+        sys.getsizeof(header.rstrip()[1:]) + sys.getsizeof(sequence.rstrip())
+        for header, sequence in itertools.islice(zip(f, f), nsample)
+        ]
+    f.close()
+    if not sizes:
+        return 0
+    return int(ntemplates * (sum(sizes) / len(sizes) + overhead))
+
+
+def choose_nbuckets(template_memory, max_memory):
+    """
+    Number of buckets of a PartitionedJoin, so that the templates of one
+    bucket take at most half of the memory budget (both in bytes)
+    """
+    return max(2, math.ceil(2 * template_memory / max_memory))
+
+
+class PartitionedJoin:
+    """
+    Joins the merged reads with their templates when the templates do 
+    not fit into memory, or in parallel. The templates and the merged 
+    reads are hash-partitioned by their (cleaned up) name into nbuckets
+    temporary files each, and then joined bucket by bucket, so that only
+    the templates of one bucket are in memory at a time (per worker, see
+    map_buckets). The partitions do not depend on the order of the reads.
+    The template IDs are the same as those of load_fasta_ids, also if 
+    there are duplicate template names: the templates are partitioned
+    with their position in the fasta file, and the positions of the 
+    duplicates (which are in the same bucket as their first occurence)
+    are collected after partitioning, so that the positions can be 
+    translated into IDs.
+    The reads can have the fields sequence, optional and quality. The
+    merged reads of further files (e.g. of other tools) can be added to
+    the same buckets with add_reads.
+    """
+
+    def __init__(self, template_path, read_path, seperator, tool_name=None,
+                 fields=('sequence',), nbuckets=16, chunk_size=100000, 
+                 tmpdir=None):
+        self.fields = tuple(fields)
+        self.nbuckets = nbuckets
+        self.chunk_size = chunk_size
+        self.tmpdir = tempfile.mkdtemp(dir=tmpdir)
+        npositions = self._partition_templates(template_path)
+        # positions of the templates whose name occured before, sorted
+        self.duplicates = self._find_duplicates()
+        # number of unique templates, like len(template_ids) of 
+        # load_fasta_ids
+        self.nrecords = npositions - len(self.duplicates)
+        # number of partitioned merged read files
+        self.nreads = 0
+        self.add_reads(read_path, seperator, tool_name)
+
+    def _bucket_path(self, kind, bucket):
+        return os.path.join(self.tmpdir, f"{kind}_{bucket}")
+
+    def _open_buckets(self, kind):
+        return [open(self._bucket_path(kind, bucket), 'wb') 
+                for bucket in range(self.nbuckets)]
+
+    def _partition_templates(self, path):
+        """ 
+        Writes position, name and sequence of each template to its 
+        bucket. Returns the number of templates.
+        """
+        buckets = self._open_buckets("templates")
+        f = _open(path)
+        nrecords = 0
+        progress = Progress(os.path.basename(path), f, "templates")
+        for position, (header, sequence) in enumerate(
+                progress.iter(zip(f, f))):
+            name = header.rstrip()[1:]
+            buckets[zlib.crc32(name) % self.nbuckets].write(
+                b'%d\t%s\t%s\n' % (position, name, sequence.rstrip()))
+            nrecords += 1
+        f.close()
+        for bucket in buckets:
+            bucket.close()
+        return nrecords
+
+    def _read_template_bucket(self, bucket):
+        """ Yields position, name and sequence of the templates of a bucket """
+        with open(self._bucket_path("templates", bucket), 'rb') as f:
+            for line in f:
+                position, name, sequence = line.rstrip(b'\n').split(b'\t')
+                yield int(position), name, sequence
+
+    def _find_duplicates(self):
+        """
+        Returns the sorted positions of the templates whose name occurs
+        earlier in the fasta file
+        """
+        duplicates = []
+        for bucket in range(self.nbuckets):
+            names = set()
+            for position, name, _ in self._read_template_bucket(bucket):
+                if name in names:
+                    duplicates.append(position)
+                names.add(name)
+        return np.sort(np.array(duplicates, dtype=np.int64))
+
+    def add_reads(self, path, seperator, tool_name=None):
+        """
+        Writes name and fields of each merged read of a file to its 
+        bucket. Returns the index of the file, see bucket_reads.
+        """
+        normalize_headers = get_header_normalizer(tool_name, seperator)
+        buckets = self._open_buckets(f"reads{self.nreads}")
+        reads = iter_fastq(path, is_merged_read, ('name',) + self.fields)
+        while True:
+            chunk = list(itertools.islice(reads, self.chunk_size))
+            if not chunk:
+                break
+            names = normalize_headers([read['name'] for read in chunk])
+            for name, read in zip(names, chunk):
+                buckets[zlib.crc32(name) % self.nbuckets].write(
+                    b'\t'.join([name] + [read[field] for field in self.fields])
+                    + b'\n')
+        for bucket in buckets:
+            bucket.close()
+        self.nreads += 1
+        return self.nreads - 1
+
+    def bucket_templates(self, bucket):
+        """
+        Loads the templates of a bucket. Returns a dict with the names as
+        keys and the template IDs as values, and a dict with the IDs as 
+        keys and the sequences as values. Duplicate names are handled as
+        in load_fasta_ids.
+        """
+        template_ids = {}
+        template_seqs = {}
+        for position, name, sequence in self._read_template_bucket(bucket):
+            template_id = template_ids.get(name)
+            if template_id is None:
+                # the ID is the position without the duplicates before it
+                template_id = position - int(np.searchsorted(
+                    self.duplicates, position))
+                template_ids[name] = template_id
+            template_seqs[template_id] = sequence
+        return template_ids, template_seqs
+
+    def bucket_reads(self, bucket, template_ids, index=0):
+        """
+        Yields the merged reads of a bucket that belong to one of its 
+        templates in chunks, like iter_merged_reads with an offset. The 
+        offset is always None, a partitioned join can not be resumed.
+        index selects the merged read file (see add_reads).
+        """
+        ids = []
+        reads = []
+        with open(self._bucket_path(f"reads{index}", bucket), 'rb') as f:
+            for line in f:
+                values = line.rstrip(b'\n').split(b'\t')
+                template_id = template_ids.get(values[0])
+                if template_id is None:
+                    continue
+                ids.append(template_id)
+                reads.append(dict(zip(self.fields, values[1:])))
+                if len(reads) == self.chunk_size:
+                    yield np.array(ids, dtype=np.int64), reads, None
+                    ids = []
+                    reads = []
+        if reads:
+            yield np.array(ids, dtype=np.int64), reads, None
+
+    def bucket_multiway(self, bucket):
+        """
+        Yields (template_id, template_seq, read_seqs) for every template
+        of a bucket, where read_seqs holds the sequence of the merged 
+        read of each merged read file, or None if the file has no read 
+        of the template. Reads that can not be assigned to a template 
+        are skipped.
+        """
+        template_ids, template_seqs = self.bucket_templates(bucket)
+        read_seqs = {template_id: [None] * self.nreads 
+                     for template_id in template_seqs}
+        for index in range(self.nreads):
+            for ids, reads, _ in self.bucket_reads(bucket, template_ids, 
+                                                   index):
+                for template_id, read in zip(ids.tolist(), reads):
+                    read_seqs[template_id][index] = read['sequence']
+        for template_id, template_seq in template_seqs.items():
+            yield template_id, template_seq, read_seqs[template_id]
+
+    def map_buckets(self, function, args=(), jobs=1):
+        """
+        Calls function(self, bucket, *args) for every bucket and yields 
+        the results in the order in which they are finished. The buckets
+        are processed by a pool of jobs worker processes, or one after 
+        the other in this process if jobs is 1. The function must be
+        defined at module level, so that the workers can import it.
+        """
+        progress = Progress("buckets", unit="buckets", every=1)
+        return progress.iter(parallel_map(functools.partial(function, self),
+                                          range(self.nbuckets), args, jobs))
+
+    def close(self):
+        """ Removes the temporary bucket files """
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+
+def multiway_join(template_path, read_paths, seperator, tool_names, 
+                  nbuckets=16):
+    """
+    Returns a PartitionedJoin of the templates with the merged reads of
+    several tools, one merged read file per tool in the order of 
+    tool_names (see PartitionedJoin.bucket_multiway). The join does not
+    depend on the order of the reads, and reads that do not belong to 
+    any template are skipped.
+    """
+    join = PartitionedJoin(template_path, read_paths[0], seperator, 
+                           tool_names[0], nbuckets=nbuckets)
+    try:
+        for path, tool_name in zip(read_paths[1:], tool_names[1:]):
+            join.add_reads(path, seperator, tool_name)
+    except BaseException:
+        join.close()
+        raise
+    return join
+
+
+# Parallel evaluation -------------------------------------------------------
+
+
+# Memory in bytes of a worker process besides the templates: the 
+# interpreter with numpy and edlib and a chunk of merged reads
+WORKER_MEMORY = 100 * 2**20
+
+
+def parallel_map(function, items, args=(), jobs=1):
+    """
+    Calls function(item, *args) for every item and yields the results in
+    the order in which they are finished. The items are processed by a 
+    pool of jobs worker processes, or one after the other in this 
+    process if jobs is 1. At most 2 * jobs items are submitted at a 
+    time, so the items can be read lazily, e.g. chunks of merged reads
+    from iter_merged_reads. The function must be defined at module 
+    level, so that the workers can import it. The workers get the 
+    progress interval of this process (see set_progress_interval).
+    """
+    if jobs == 1:
+        for item in items:
+            yield function(item, *args)
+        return
+    with concurrent.futures.ProcessPoolExecutor(
+            jobs, initializer=set_progress_interval, 
+            initargs=(_progress_interval,)) as pool:
+        pending = set()
+        for item in items:
+            if len(pending) >= 2 * jobs:
+                done, pending = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+            pending.add(pool.submit(function, item, *args))
+        for future in concurrent.futures.as_completed(pending):
+            yield future.result()
+
+
+# shared template stores that are attached in this process, by name
+_attached_stores = {}
+
+
+class SharedTemplateStore:
+    """
+    Read-only store of the template sequences in one block of shared 
+    memory (multiprocessing.shared_memory), for worker processes. The 
+    block holds the number of templates, the offsets of the sequences
+    and the concatenated sequences. A store is pickled as its name, so 
+    passing it to a worker only attaches the worker to the same block.
+    store[template_id] returns a new bytes object, so lookups do not 
+    touch any reference counts on the shared pages and the memory of the
+    workers stays flat, unlike with a forked list of sequences.
+    The process that created the store must close and unlink it.
+    """
+
+    def __init__(self, shm):
+        self.shm = shm
+        ntemplates = int(np.frombuffer(shm.buf, dtype=np.int64, count=1)[0])
+        self.offsets = np.frombuffer(shm.buf, dtype=np.int64, 
+                                     count=ntemplates + 1, offset=8)
+        self.data_start = 8 * (ntemplates + 2)
+
+    @classmethod
+    def _allocate(cls, lengths):
+        """ Returns a new store for sequences of the given lengths """
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        data_start = 8 * (len(lengths) + 2)
+        shm = shared_memory.SharedMemory(
+            create=True, size=max(1, data_start + int(offsets[-1])))
+        shm.buf[:8] = np.int64(len(lengths)).tobytes()
+        shm.buf[8:data_start] = offsets.tobytes()
+        return cls(shm)
+
+    @classmethod
+    def create(cls, template_seqs, chunk_size=100000):
+        """ Copies a list of template sequences into a new store """
+        store = cls._allocate([len(seq) for seq in template_seqs])
+        for start in range(0, len(template_seqs), chunk_size):
+            data = b''.join(template_seqs[start:start+chunk_size])
+            position = store.data_start + int(store.offsets[start])
+            store.shm.buf[position:position+len(data)] = data
+        return store
+
+    @classmethod
+    def from_fasta(cls, path):
+        """
+        Loads a zipped or unzipped fasta file into a new store, without a
+        list of the sequences in between: the file is read once for the 
+        names and the lengths of the sequences and once more to copy the
+        sequences into the store. Returns the names and IDs like 
+        load_fasta_ids and the store.
+        """
+        template_ids = {}
+        lengths = []
+        # record number of the last occurence of each template
+        last_records = []
+        f = _open(path)
+        progress = Progress(os.path.basename(path), f, "templates")
+        records = enumerate(progress.iter(zip(f, f)))
+        for record, (header, sequence) in records:
+            name = header.rstrip()[1:]
+            template_id = template_ids.setdefault(name, len(lengths))
+            if template_id == len(lengths):
+                lengths.append(0)
+                last_records.append(0)
+            lengths[template_id] = len(sequence.rstrip())
+            last_records[template_id] = record
+        f.close()
+        store = cls._allocate(lengths)
+        del lengths
+        f = _open(path)
+        for record, (header, sequence) in enumerate(zip(f, f)):
+            template_id = template_ids[header.rstrip()[1:]]
+            if last_records[template_id] == record:
+                sequence = sequence.rstrip()
+                position = store.data_start + int(store.offsets[template_id])
+                store.shm.buf[position:position+len(sequence)] = sequence
+        f.close()
+        return template_ids, store
+
+    @classmethod
+    def attach(cls, name):
+        """ Attaches to the store with the given name """
+        if name not in _attached_stores:
+            _attached_stores[name] = cls(shared_memory.SharedMemory(name))
+        return _attached_stores[name]
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def __reduce__(self):
+        return SharedTemplateStore.attach, (self.name,)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, template_id):
+        start = self.data_start + int(self.offsets[template_id])
+        stop = self.data_start + int(self.offsets[template_id + 1])
+        return bytes(self.shm.buf[start:stop])
+
+    def close(self):
+        """ Detaches this process from the store """
+        self.offsets = None
+        _attached_stores.pop(self.name, None)
+        self.shm.close()
+
+    def unlink(self):
+        """ Frees the shared memory, after all processes are done """
+        self.shm.unlink()
+
+
+# Checkpoints ---------------------------------------------------------------
+
+
+class Checkpoint:
+    """
+    Saves the state of a long running evaluation, e.g. its counters and
+    the offset in the input file up to which they were counted (see 
+    iter_merged_reads), in a small JSON file, so that it can be resumed
+    after it was killed. The state is saved at most every interval 
+    seconds and the file is replaced atomically, so it always holds a
+    complete state. The inputs (e.g. paths and options) are stored along
+    with the state, a checkpoint of other inputs is not resumed.
+    """
+
+    def __init__(self, path, inputs, interval=600):
+        self.path = path
+        self.inputs = inputs
+        self.interval = interval
+        self._last_save = time.monotonic()
+
+    def load(self):
+        """
+        Returns the saved state, or None if there is no checkpoint yet.
+        Numpy arrays in the state are returned as lists.
+        """
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path) as f:
+            checkpoint = json.load(f)
+        if checkpoint['inputs'] != json.loads(json.dumps(self.inputs)):
+            raise ValueError(f"The checkpoint {self.path} belongs to other "
+                             f"inputs: {checkpoint['inputs']}")
+        return checkpoint['state']
+
+    def save(self, state, force=False):
+        """
+        Saves the state (a dict of numbers, strings, lists and numpy 
+        arrays) if the interval has passed since the last save
+        """
+        if not force and time.monotonic() - self._last_save < self.interval:
+            return
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'inputs': self.inputs, 'state': state}, f,
+                      default=lambda value: value.tolist())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._last_save = time.monotonic()
+
+    def remove(self):
+        """ Removes the checkpoint, after the evaluation is finished """
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+# Profiling -----------------------------------------------------------------
+
+
+def _read_proc_status(field):
+    """ Returns a field of /proc/self/status in kB, or None """
+    try:
+        with open("/proc/self/status", 'rb') as f:
+            for line in f:
+                if line.startswith(field.encode() + b':'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _reset_peak_rss():
+    """
+    Resets the peak RSS of this process (VmHWM), so that the peak of
+    every stage can be measured. Returns False if the kernel does not
+    allow it.
+    """
+    try:
+        with open("/proc/self/clear_refs", 'w') as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _cpu_seconds():
+    """ CPU time (user + system) of this process and its finished children """
+    times = os.times()
+    return (times.user + times.system + times.children_user
+            + times.children_system)
+
+
+class StageProfiler:
+    """
+    Measures the wall clock time, the CPU time and the peak RSS of the
+    stages of an evaluation (e.g. loading, analysis, export), and saves
+    them as a JSON sidecar of the result file. A stage lasts from its
+    start() to the next start() or stop(). The CPU time includes worker
+    processes once they are finished. The peak RSS of a stage is
+    measured by resetting the peak of the process at its start (Linux
+    4.0 and later), otherwise it is the peak of the whole run so far.
+    If cprofile_path is given, the whole run is also profiled with
+    cProfile and the stats are dumped there.
+    Without a path, nothing is measured and all methods do nothing.
+    """
+
+    def __init__(self, path=None, cprofile_path=None):
+        self.path = path
+        self.cprofile_path = cprofile_path
+        self.stages = []
+        self._current = None
+        self._profile = None
+        self._start = (time.perf_counter(), _cpu_seconds())
+        if path is not None and cprofile_path is not None:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+
+    def start(self, name):
+        """ Ends the current stage and starts the next one """
+        if self.path is None:
+            return
+        self.stop()
+        peak_reset = _reset_peak_rss()
+        self._current = {
+            'name': name,
+            'wall': time.perf_counter(),
+            'cpu': _cpu_seconds(),
+            'rss_start_kb': _read_proc_status("VmRSS"),
+            'peak_reset': peak_reset,
+            }
+
+    def stop(self):
+        """ Ends the current stage """
+        if self.path is None or self._current is None:
+            return
+        stage = self._current
+        self.stages.append({
+            'name': stage['name'],
+            'wall_s': round(time.perf_counter() - stage['wall'], 4),
+            'cpu_s': round(_cpu_seconds() - stage['cpu'], 4),
+            'rss_start_kb': stage['rss_start_kb'],
+            'rss_end_kb': _read_proc_status("VmRSS"),
+            'peak_rss_kb': _read_proc_status("VmHWM"),
+            'peak_rss_of_stage': stage['peak_reset'],
+            })
+        self._current = None
+
+    def save(self):
+        """ Ends the current stage and writes the JSON sidecar """
+        if self.path is None:
+            return
+        self.stop()
+        if self._profile is not None:
+            self._profile.disable()
+            self._profile.dump_stats(self.cprofile_path)
+        wall, cpu = self._start
+        with open(self.path, 'w') as f:
+            json.dump({
+                'argv': sys.argv,
+                'stages': self.stages,
+                'total': {
+                    'wall_s': round(time.perf_counter() - wall, 4),
+                    'cpu_s': round(_cpu_seconds() - cpu, 4),
+                    'peak_rss_kb': max(
+                        [stage['peak_rss_kb'] or 0
+                         for stage in self.stages] + [0]),
+                    },
+                'cprofile': self.cprofile_path,
+                }, f, indent=2)
+
+
+# Progress ------------------------------------------------------------------
+
+
+# seconds between two progress lines, None if no progress is reported
+_progress_interval = None
+
+
+def set_progress_interval(interval):
+    """
+    Makes the readers (load_fasta_ids, iter_fastq, iter_merged_reads, 
+    the partitioned join, ...) print a progress line to stderr every
+    interval seconds, or not at all if interval is None (the default).
+    The worker processes of parallel_map get the setting of this process
+    when they are started, also with the spawn start method.
+    """
+    global _progress_interval
+    _progress_interval = interval
+
+
+def _current_rss():
+    """ Returns the current RSS of this process in bytes, or None """
+    try:
+        with open("/proc/self/statm", 'rb') as f:
+            return int(f.read().split()[1]) * mmap.PAGESIZE
+    except OSError:
+        return None
+
+
+def _format_bytes(nbytes):
+    for unit in ("B", "kB", "MB", "GB"):
+        if nbytes < 1024:
+            break
+        nbytes /= 1024
+    else:
+        unit = "TB"
+    return f"{nbytes:.1f} {unit}"
+
+
+class Progress:
+    """
+    Reports the progress of a loop over records on stderr: the records 
+    processed, the records per second, the current RSS and, if the file
+    the records are read from is given, the bytes read from it (after 
+    decompression) and the fraction of the file that was read. 
+    The clock is only checked every `every` records, and without a 
+    progress interval (see set_progress_interval) the records are not 
+    even wrapped, so the hot loops of the readers do not get slower.
+    A last line is printed when the loop is finished, if it took longer
+    than one interval.
+    """
+
+    def __init__(self, label, f=None, unit="records", every=4096):
+        self.label = label
+        self.f = f
+        self.unit = unit
+        self.every = every
+        self.interval = _progress_interval
+
+    def iter(self, records):
+        """ Returns the records, wrapped if progress is reported """
+        if self.interval is None:
+            return records
+        return self._iter(records)
+
+    def _iter(self, records):
+        start = last = time.monotonic()
+        nrecords = 0
+        reported = False
+        for record in records:
+            yield record
+            nrecords += 1
+            if nrecords % self.every == 0:
+                now = time.monotonic()
+                if now - last >= self.interval:
+                    self.report(nrecords, now - start)
+                    last = now
+                    reported = True
+        if reported:
+            self.report(nrecords, time.monotonic() - start, done=True)
+
+    def _file_position(self):
+        """ Returns the bytes read from the file and the fraction read """
+        f = self.f
+        try:
+            position = f.tell()
+            # position in the compressed file, for the fraction
+            raw = f.fileobj if isinstance(f, gzip.GzipFile) else f
+            size = os.fstat(raw.fileno()).st_size
+            return position, raw.tell() / size if size else 1.0
+        except (OSError, ValueError):
+            return None, None
+
+    def report(self, nrecords, elapsed, done=False):
+        """ Prints a progress line """
+        line = (f"{self.label}: {'done, ' if done else ''}"
+                f"{nrecords:,} {self.unit} in {elapsed:.0f} s, "
+                f"{nrecords / elapsed if elapsed else 0:,.0f} {self.unit}/s")
+        if self.f is not None:
+            position, fraction = self._file_position()
+            if position is not None:
+                verb = ("decompressed" if isinstance(self.f, gzip.GzipFile) 
+                        else "read")
+                line += (f", {_format_bytes(position)} {verb} "
+                         f"({fraction:.0%} of the file)")
+        rss = _current_rss()
+        if rss is not None:
+            line += f", RSS {_format_bytes(rss)}"
+        print(line, file=sys.stderr, flush=True)
+
+
+# Edit distance evaluation --------------------------------------------------
+
+
+def add_evaluation_arguments(parser):
+    """
+    Adds the optional arguments of the edit distance evaluations of the
+    merging_accuracy_* scripts to an argparse parser
+    """
+    parser.add_argument(
+        "-a", "--arrays", action="store", type=str, required=False,
+        dest="arrays_prefix", help="Prefix for the per-template result "
+                                   "arrays ({prefix}_merged.npy, "
+                                   "{prefix}_length.npy, "
+                                   "{prefix}_edit_distance.npy), indexed by "
+                                   "template ID: the templates are numbered "
+                                   "in the order of the first occurence of "
+                                   "their name in the fasta file")
+    parser.add_argument(
+        "-c", "--align-cache", action="store", type=str, required=False,
+        dest="cache_path", help="SQLite file of an alignment cache that is "
+                                "shared between evaluations, so that pairs "
+                                "of template and merged read that were "
+                                "already aligned for another tool are not "
+                                "aligned again")
+    parser.add_argument(
+        "--align-cache-size", action="store", type=int, default=10000000,
+        dest="cache_size", help="Maximum number of pairs in the alignment "
+                                "cache (default: 10000000)")
+    parser.add_argument(
+        "--aligner", action="store", type=str, default="edlib",
+        choices=sorted(alignment.ALIGNERS), help="Engine for the edit "
+        "distances: edlib aligns pair by pair, myers is a slower reference "
+        "implementation that aligns batches of pairs with a bit-parallel "
+        "numpy kernel, to check the results of edlib (default: edlib)")
+    parser.add_argument(
+        "-k", "--max-edit-distance", action="store", type=int, 
+        required=False, dest="max_edit_dist", help="Edit distances larger "
+        "than this are not computed exactly and counted as k + 1. The plots "
+        "put all edit distances above 25 into one bin.")
+    parser.add_argument(
+        "--sample", action="store", type=int, required=False,
+        dest="sample_size", help="Only evaluate a hash-based random sample of "
+        "this many templates (the same templates for all tools) and scale "
+        "the results up to all templates. The output gets the additional "
+        "columns sampled_templates and the bounds of 95%% confidence "
+        "intervals (*_lower, *_upper). With --target-ci, this is the size "
+        "of the first round (default: 10000)")
+    parser.add_argument(
+        "--target-ci", action="store", type=float, required=False,
+        dest="target_ci", help="Keep doubling the sample until the "
+        "confidence intervals of the merge rate and of the proportion of "
+        "templates in each edit distance bin are at most this wide, e.g. "
+        "0.01")
+    parser.add_argument(
+        "--bootstrap", action="store", type=int, required=False,
+        dest="nbootstrap", help="Number of Poisson bootstrap replicates. "
+        "Adds the column bootstrap_replicates and the bounds of 95%% "
+        "confidence intervals of the results (*_lower, *_upper), e.g. 200")
+
+
+def add_run_arguments(parser):
+    """
+    Adds the optional arguments for long running evaluations (checkpoints,
+    memory budget, worker processes, profiling and progress) to an 
+    argparse parser
+    """
+    parser.add_argument(
+        "--checkpoint", action="store", type=str, required=False,
+        dest="checkpoint_path", help="JSON file to which the counts and "
+        "the position in the merged reads file are saved regularly, so "
+        "that the evaluation can be resumed with --resume")
+    parser.add_argument(
+        "--resume", action="store_true", help="Resume from the checkpoint, "
+        "if it exists")
+    parser.add_argument(
+        "--checkpoint-interval", action="store", type=int, default=600,
+        dest="checkpoint_interval", help="Seconds between two checkpoints "
+        "(default: 600)")
+    parser.add_argument(
+        "--max-memory", action="store", type=int, required=False,
+        dest="max_memory", help="Memory budget in MB. If the templates "
+        "would not fit into it, the templates and the merged reads are "
+        "hash-partitioned into buckets on disk (in TMPDIR) and joined "
+        "bucket by bucket")
+    parser.add_argument(
+        "-j", "--jobs", action="store", type=int, default=1,
+        help="Number of worker processes. With more than one, chunks of "
+        "merged reads are evaluated in parallel against templates in shared "
+        "memory, or the hash partitions with --max-memory (default: 1)")
+    parser.add_argument(
+        "--profile", action="store_true", help="Save the wall clock time, "
+        "the CPU time and the peak RSS of the loading, the analysis and the "
+        "export to <out>.profile.json")
+    parser.add_argument(
+        "--cprofile", action="store_true", help="Also profile the whole run "
+        "with cProfile and dump the stats to <out>.prof (implies --profile)")
+    parser.add_argument(
+        "--progress", action="store", type=float, required=False,
+        dest="progress_interval", help="Print the reads processed, the "
+        "reads per second, the bytes decompressed and the RSS to stderr "
+        "every this many seconds (default: no progress)")
+
+
+def check_run_arguments(parser, args):
+    """ Exits with an error for unsupported run options, see add_run_arguments """
+    if args.resume and args.checkpoint_path is None:
+        parser.error("--resume requires --checkpoint")
+    if args.max_memory is not None and args.checkpoint_path is not None:
+        parser.error("--max-memory can not be combined with --checkpoint")
+    if args.jobs > 1 and args.checkpoint_path is not None:
+        parser.error("--jobs can not be combined with --checkpoint")
+    if args.cprofile:
+        args.profile = True
+
+
+def check_evaluation_arguments(parser, args):
+    """
+    Exits with an error for unsupported combinations of the options of 
+    add_evaluation_arguments and add_run_arguments
+    """
+    if args.target_ci is not None and args.sample_size is None:
+        args.sample_size = 10000
+    if args.sample_size is not None and args.arrays_prefix is not None:
+        parser.error("--arrays can not be combined with --sample")
+    if args.sample_size is not None and args.nbootstrap is not None:
+        parser.error("--bootstrap can not be combined with --sample")
+    if args.checkpoint_path is not None and (args.sample_size is not None 
+                                             or args.arrays_prefix is not None):
+        parser.error("--checkpoint can not be combined with --sample or "
+                     "--arrays")
+    if args.max_memory is not None and args.sample_size is not None:
+        parser.error("--max-memory can not be combined with --sample")
+    if args.jobs > 1 and args.sample_size is not None:
+        parser.error("--jobs can not be combined with --sample")
+    check_run_arguments(parser, args)
+
+
+def evaluation_options(**options):
+    """
+    Returns the options of add_evaluation_arguments and add_run_arguments
+    as an argparse.Namespace, with the defaults for the options that are
+    not given, e.g. to call the main function of an evaluation script 
+    from python
+    """
+    parser = argparse.ArgumentParser()
+    add_evaluation_arguments(parser)
+    add_run_arguments(parser)
+    defaults = vars(parser.parse_args([]))
+    unknown = set(options) - set(defaults)
+    if unknown:
+        raise TypeError(f"unknown options: {', '.join(sorted(unknown))}")
+    return argparse.Namespace(**{**defaults, **options})
+
+
+def get_partitioned_join(template_path, readm_path, nfrags, seperator, 
+                         tool_name, fields=('sequence',), max_memory=None, 
+                         jobs=1, reserved_memory=0):
+    """
+    Returns a PartitionedJoin of the templates and the merged reads (with
+    the given fields) if the templates would not fit into max_memory (in
+    MB), otherwise None. reserved_memory (in bytes) is needed besides
+    the templates, e.g. for the per-template arrays, and is subtracted 
+    from max_memory, as is WORKER_MEMORY for each of the jobs worker 
+    processes.
+    """
+    nbuckets = None
+    if max_memory is not None:
+        # the workers share one copy of the templates (SharedTemplateStore)
+        template_memory = estimate_template_memory(template_path, nfrags)
+        worker_memory = jobs * WORKER_MEMORY if jobs > 1 else 0
+        # at least a MB for the templates of a bucket
+        available_memory = max(
+            max_memory * 2**20 - reserved_memory - worker_memory, 2**20)
+        if template_memory > available_memory:
+            # but every job has the templates of its bucket in memory
+            nbuckets = choose_nbuckets(jobs * template_memory, 
+                                       available_memory)
+            print(f"the templates need about {template_memory // 2**20} MB "
+                  f"with {jobs} jobs, more than --max-memory")
+            # more buckets than jobs, so that all jobs have work until the end
+            nbuckets = max(nbuckets, 4 * jobs)
+    if nbuckets is None:
+        return None
+    print(f"joining the templates and the merged reads in {nbuckets} "
+          "buckets on disk")
+    return PartitionedJoin(template_path, readm_path, seperator, tool_name, 
+                           fields=fields, nbuckets=nbuckets)
+
+
+def get_edit_distances(template_ids, merged_reads, template_seqs, 
+                       cache=None, aligner="edlib", max_edit_dist=None):
+    """
+    Returns a numpy array with the edit distance of each merged read to
+    its template, see alignment.get_edit_distances
+    """
+    return alignment.get_edit_distances(
+        [template_seqs[template_id] for template_id in template_ids.tolist()],
+        [read['sequence'] for read in merged_reads],
+        cache, aligner, max_edit_dist)
+
+
+def make_edit_distances_string(edit_dist_counts):
+    """Returns the counts of the edit distances as a dict-like string""" 
+    edit_dist_string = ""
+    for edit_dist in np.flatnonzero(edit_dist_counts):
+        edit_dist_string += f"{edit_dist}:"
+        edit_dist_string += f"{edit_dist_counts[edit_dist]} "
+    return edit_dist_string
+
+
+def evaluate_merged_reads(chunks, template_seqs, state, cache=None, 
+                          aligner="edlib", max_edit_dist=None, bootstrap=None,
+                          checkpoint=None, template_arrays=None):
+    """
+    Counts the edit distances of the merged reads chunk by chunk, for 
+    chunks with offsets from iter_merged_reads. The counts and the 
+    offset are kept in state, which is saved to the checkpoint after the
+    chunks (at most every checkpoint interval). The template IDs, 
+    lengths and edit distances of the reads are added to template_arrays
+    (TemplateArrays or TemplateResults), if given.
+    """
+    for read_ids, reads, offset in chunks:
+        edit_dist_list = get_edit_distances(read_ids, reads, template_seqs, 
+                                            cache, aligner, max_edit_dist)
+        state['edit_dist_counts'] = add_counts(state['edit_dist_counts'], 
+                                               edit_dist_list)
+        state['offset'] = offset
+        if bootstrap is not None:
+            bootstrap.add(read_ids, edit_dist_list)
+            state['bootstrap'] = bootstrap.get_state()
+        if template_arrays is not None:
+            read_lengths = np.fromiter(
+                (len(read['sequence']) for read in reads), dtype=np.int64, 
+                count=len(reads))
+            template_arrays.add(read_ids, read_lengths, edit_dist_list)
+        if checkpoint is not None:
+            checkpoint.save(state)
+    return state
+
+
+def _evaluate_in_worker(chunks, template_seqs, cache_path=None, 
+                        cache_size=10000000, aligner="edlib", 
+                        max_edit_dist=None, nbootstrap=None, nrecords=0, 
+                        keep_per_template=False):
+    """
+    Evaluates chunks of merged reads in a worker process, with its own
+    alignment cache and bootstrap. Returns the state of 
+    evaluate_merged_reads, the per-template results of the chunks (see
+    TemplateResults.get, or None) and the hits and misses of the 
+    alignment cache.
+    """
+    cache = None
+    if cache_path is not None:
+        cache = alignment.AlignmentCache(cache_path, cache_size)
+    bootstrap = None
+    if nbootstrap is not None:
+        bootstrap = estimation.PoissonBootstrap(nrecords, nbootstrap)
+    template_results = TemplateResults() if keep_per_template else None
+    state = {'offset': None, 'edit_dist_counts': np.zeros(0, dtype=np.int64)}
+    state = evaluate_merged_reads(chunks, template_seqs, state, cache, 
+                                  aligner, max_edit_dist, bootstrap, None, 
+                                  template_results)
+    cache_stats = (0, 0)
+    if cache is not None:
+        cache_stats = (cache.hits, cache.misses)
+        cache.close()
+    if template_results is not None:
+        template_results = template_results.get()
+    return state, template_results, cache_stats
+
+
+def _evaluate_bucket(join, bucket, *args):
+    """
+    Evaluates the merged reads of one bucket of a PartitionedJoin, 
+    usually in a worker process. Returns the number of templates in the 
+    bucket and the results of _evaluate_in_worker.
+    """
+    template_ids, template_seqs = join.bucket_templates(bucket)
+    return ((len(template_ids),) 
+            + _evaluate_in_worker(join.bucket_reads(bucket, template_ids), 
+                                  template_seqs, *args))
+
+
+def _evaluate_chunk(chunk, store, *args):
+    """
+    Evaluates one chunk of merged reads from iter_merged_reads in a 
+    worker process, with the templates in a SharedTemplateStore. Returns
+    the results of _evaluate_in_worker.
+    """
+    return _evaluate_in_worker([chunk], store, *args)
+
+
+def _merge_worker_results(state, results, bootstrap=None, 
+                          template_arrays=None, cache=None):
+    """
+    Adds the results of _evaluate_in_worker to state, the bootstrap, 
+    the TemplateArrays and the hits and misses of the cache. Returns the 
+    state.
+    """
+    worker_state, template_results, cache_stats = results
+    state['edit_dist_counts'] = merge_counts(
+        state['edit_dist_counts'], worker_state['edit_dist_counts'])
+    if bootstrap is not None and 'bootstrap' in worker_state:
+        bootstrap.merge_state(worker_state['bootstrap'])
+    if template_arrays is not None:
+        template_arrays.add(*template_results)
+    if cache is not None:
+        cache.hits += cache_stats[0]
+        cache.misses += cache_stats[1]
+    return state
+
+
+def evaluate_partitioned(join, state, jobs=1, cache=None, cache_path=None, 
+                         cache_size=10000000, aligner="edlib", 
+                         max_edit_dist=None, bootstrap=None, 
+                         template_arrays=None):
+    """
+    Evaluates all buckets of a PartitionedJoin with jobs worker processes
+    and adds their results to state, the bootstrap and the 
+    TemplateArrays. Returns the number of (unique) templates and the 
+    state.
+    """
+    nbootstrap = None if bootstrap is None else bootstrap.nreplicates
+    args = (cache_path, cache_size, aligner, max_edit_dist, nbootstrap, 
+            join.nrecords, template_arrays is not None)
+    ntemplates = 0
+    for bucket_ntemplates, *results \
+            in join.map_buckets(_evaluate_bucket, args, jobs):
+        ntemplates += bucket_ntemplates
+        state = _merge_worker_results(state, results, bootstrap, 
+                                      template_arrays, cache)
+    return ntemplates, state
+
+
+def evaluate_parallel(chunks, store, state, jobs, cache=None, 
+                      cache_path=None, cache_size=10000000, aligner="edlib",
+                      max_edit_dist=None, bootstrap=None, 
+                      template_arrays=None):
+    """
+    Evaluates chunks of merged reads with jobs worker processes, which 
+    share the template sequences through a SharedTemplateStore instead 
+    of a copy each. Returns the state.
+    """
+    nbootstrap = None if bootstrap is None else bootstrap.nreplicates
+    args = (store, cache_path, cache_size, aligner, max_edit_dist, 
+            nbootstrap, len(store), template_arrays is not None)
+    for results in parallel_map(_evaluate_chunk, chunks, args, jobs):
+        state = _merge_worker_results(state, results, bootstrap, 
+                                      template_arrays, cache)
+    return state
+
+
+def evaluate_edit_distances(template_path, readm_path, nfrags, seperator, 
+                            tool_name, options, fraglen=None, 
+                            checkpoint=None, profiler=None):
+    """
+    Computes the edit distances of the merged reads to their templates,
+    with the options of add_evaluation_arguments and add_run_arguments 
+    (see evaluation_options): in memory or with a PartitionedJoin, in 
+    this process or in worker processes, for all reads or for a sample 
+    of the templates. If a Checkpoint is given, the counts are saved to
+    it regularly and, with options.resume, resumed from it. The stages 
+    of the evaluation are measured with the StageProfiler, if given.
+    Returns a dict with the number of (unique) templates, the counts of
+    the edit distances, the number of merged reads, the edit distances 
+    string, the confidence interval columns of the sample or the 
+    bootstrap (the average divergence per nt only if fraglen is given)
+    and the per-template arrays (see TemplateArrays) or None.
+    """
+    if profiler is None:
+        profiler = StageProfiler()
+    profiler.start("load")
+    # the per-template arrays are in memory besides the templates
+    reserved_memory = 0
+    if options.arrays_prefix is not None:
+        reserved_memory = template_arrays_memory(nfrags)
+    join = get_partitioned_join(template_path, readm_path, nfrags, seperator,
+                                tool_name, ('sequence',), options.max_memory,
+                                options.jobs, reserved_memory)
+    store = None
+    if join is None and options.jobs > 1:
+        # the templates are only loaded into the store for the workers
+        template_ids, store = SharedTemplateStore.from_fasta(template_path)
+        ntemplates = nrecords = len(template_ids)
+    elif join is None:
+        template_ids, template_seqs = load_fasta_ids(template_path)
+        ntemplates = nrecords = len(template_ids)
+    else:
+        ntemplates = nrecords = join.nrecords
+
+    profiler.start("analysis")
+    cache = None
+    if options.cache_path is not None:
+        cache = alignment.AlignmentCache(options.cache_path, 
+                                         options.cache_size)
+    bootstrap = None
+    if options.nbootstrap is not None:
+        bootstrap = estimation.PoissonBootstrap(nrecords, options.nbootstrap)
+    template_arrays = None
+
+    if options.sample_size is None:
+        # edit distances of all reads, counted chunk by chunk
+        state = {'offset': 0, 'edit_dist_counts': np.zeros(0, dtype=np.int64)}
+        saved_state = None
+        if checkpoint is not None and options.resume:
+            saved_state = checkpoint.load()
+        if saved_state is not None:
+            print(f"resuming at byte {saved_state['offset']} of {readm_path}")
+            state = saved_state
+            state['edit_dist_counts'] = np.array(state['edit_dist_counts'], 
+                                                 dtype=np.int64)
+            if bootstrap is not None:
+                bootstrap.set_state(state['bootstrap'])
+        if options.arrays_prefix is not None:
+            template_arrays = TemplateArrays(nrecords)
+        args = (cache, options.cache_path, options.cache_size, 
+                options.aligner, options.max_edit_dist, bootstrap, 
+                template_arrays)
+        if join is None:
+            # only the template ID and the sequence of the merged reads are 
+            # needed
+            chunks = iter_merged_reads(readm_path, template_ids, seperator, 
+                                       tool_name, fields=('sequence',), 
+                                       offset=state['offset'])
+            if store is not None:
+                try:
+                    state = evaluate_parallel(chunks, store, state, 
+                                              options.jobs, *args)
+                finally:
+                    store.close()
+                    store.unlink()
+            else:
+                state = evaluate_merged_reads(
+                    chunks, template_seqs, state, cache, options.aligner, 
+                    options.max_edit_dist, bootstrap, checkpoint, 
+                    template_arrays)
+        else:
+            try:
+                ntemplates, state = evaluate_partitioned(join, state, 
+                                                         options.jobs, *args)
+            finally:
+                join.close()
+        edit_dist_counts = state['edit_dist_counts']
+    else:
+        # edit distances of the reads of a sample of the templates
+        read_ids, reads = load_merged_reads(readm_path, template_ids, 
+                                            seperator, tool_name, 
+                                            fields=('sequence',))
+        nsampled, _, edit_dist_list = estimation.sequential_sample(
+            ntemplates, read_ids, 
+            lambda indices: get_edit_distances(
+                read_ids[indices], [reads[i] for i in indices.tolist()], 
+                template_seqs, cache, options.aligner, options.max_edit_dist),
+            options.sample_size, options.target_ci)
+        edit_dist_counts = np.bincount(edit_dist_list)
+    if cache is not None:
+        print(f"alignment cache: {cache.hits} hits, {cache.misses} misses")
+        cache.close()
+
+    results = {
+        'ntemplates': ntemplates,
+        'edit_dist_counts': edit_dist_counts,
+        'total_reads': int(edit_dist_counts.sum()),
+        'edit_distances': make_edit_distances_string(edit_dist_counts),
+        'interval_columns': {},
+        'template_arrays': None,
+        }
+    # estimates for all templates and their confidence intervals
+    if options.sample_size is not None:
+        interval_columns = estimation.sample_estimates(
+            edit_dist_list, nsampled, ntemplates)
+        results['total_reads'] = interval_columns.pop('total_reads')
+        results['edit_distances'] = interval_columns.pop('edit_distances')
+        results['interval_columns'] = interval_columns
+    if bootstrap is not None:
+        results['interval_columns'] = bootstrap.intervals(nfrags, fraglen)
+    if template_arrays is not None:
+        results['template_arrays'] = template_arrays.arrays
+    return results
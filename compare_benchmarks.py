@@ -0,0 +1,168 @@
+#!/usr/bin/python3
+
+"""
+Compares the benchmark files of two runs of a pipeline (e.g. before and
+after a tool upgrade, or the current and the default_minlen_minoverlap
+tree) and flags significant slowdowns and memory regressions per tool.
+Only the benchmark files that exist in both directories, with the same
+relative path, are compared. The files are grouped by their directory
+(e.g. {tool}/*.tsv, threads/{tool}/*.tsv and nfrags/{tool}/*.tsv are 
+three groups), files directly in the benchmark directory ({tool}.tsv)
+are a group each.
+
+A group with a single benchmark file (runtime_memory, {tool}.tsv with
+repeats) is tested with a one-sided Mann-Whitney U test of the repeats.
+A group with one file per dataset ({tool}/*.tsv, mostly without 
+repeats) is tested with a one-sided Wilcoxon signed-rank test of the log
+ratios of the per-file medians. A regression is a significant increase
+that is also larger than --min-change.
+
+Exit status: 0 if there is no regression, 1 if there is one, 2 if no
+benchmark file exists in both directories.
+"""
+
+
+import argparse
+import os
+import sys
+import numpy as np
+import pandas as pd
+import scipy.stats as st
+import benchmarking
+
+
+def parse_arguments():
+    """
+    """
+    parser = argparse.ArgumentParser(
+        description="Compares two directories of snakemake benchmark files "
+                    "and exits with status 1 if a tool got significantly "
+                    "slower or uses significantly more memory.")
+
+    # required arguments
+    parser.add_argument(
+        "baseline_dir", help="Benchmark directory of the previous run")
+    parser.add_argument(
+        "current_dir", help="Benchmark directory of the current run")
+
+    # optional arguments
+    parser.add_argument(
+        "-m", "--metrics", action="store", type=str, nargs="+",
+        default=["s", "max_uss"],
+        help="Columns of the benchmark files to compare (default: s max_uss)")
+    parser.add_argument(
+        "-a", "--alpha", action="store", type=float, default=0.01,
+        help="Significance level of the one-sided tests (default: 0.01)")
+    parser.add_argument(
+        "-c", "--min-change", action="store", type=float, default=0.05,
+        dest="min_change",
+        help="Smallest relative increase of the median that is reported as "
+             "a regression (default: 0.05)")
+    parser.add_argument(
+        "-o", "--out", action="store", type=str, required=False,
+        dest="export_path", help="Path of a csv file with the comparison "
+                                 "of every tool and metric")
+
+    args = parser.parse_args()
+    arguments = [
+        args.baseline_dir,
+        args.current_dir,
+        args.metrics,
+        args.alpha,
+        args.min_change,
+        args.export_path,
+        ]
+    return arguments
+
+
+def load_matched_benchmarks(baseline_dir, current_dir):
+    """
+    Returns the benchmarks that exist in both directories, per group 
+    (see benchmarking.group_of), as a dict of the group and a list of 
+    (baseline, current) data frames
+    """
+    baseline = benchmarking.find_benchmarks(baseline_dir)
+    current = benchmarking.find_benchmarks(current_dir)
+    matched = {}
+    for relpath in sorted(baseline.keys() & current.keys()):
+        matched.setdefault(benchmarking.group_of(relpath), []).append((
+            benchmarking.read_benchmark(baseline[relpath]),
+            benchmarking.read_benchmark(current[relpath]),
+            ))
+    return matched
+
+
+def compare_tool(pairs, metric):
+    """
+    Tests whether a metric increased from the baseline to the current
+    benchmarks of one group. Returns a dict with the test, the median
+    ratio current / baseline and the one-sided p-value.
+    """
+    pairs = [(baseline[metric].dropna(), current[metric].dropna())
+             for baseline, current in pairs
+             if metric in baseline.columns and metric in current.columns]
+    pairs = [(baseline, current) for baseline, current in pairs
+             if len(baseline) and len(current)]
+    if not pairs:
+        return {"test": None, "files": 0, "ratio": np.nan, "p": np.nan}
+
+    if len(pairs) == 1:
+        baseline, current = pairs[0]
+        ratio = current.median() / baseline.median()
+        p = np.nan
+        if len(baseline) > 1 and len(current) > 1:
+            p = st.mannwhitneyu(current, baseline,
+                                alternative="greater").pvalue
+        return {"test": "mann-whitney", "files": 1, "ratio": ratio, "p": p}
+
+    # paired by dataset, the datasets differ in size
+    with np.errstate(divide="ignore", invalid="ignore"):
+        log_ratios = np.array([
+            np.log(current.median() / baseline.median())
+            for baseline, current in pairs
+            ])
+    log_ratios = log_ratios[np.isfinite(log_ratios)]
+    ratio, p = np.nan, np.nan
+    if len(log_ratios):
+        ratio = np.exp(np.median(log_ratios))
+    if np.any(log_ratios != 0):
+        p = st.wilcoxon(log_ratios, alternative="greater").pvalue
+    return {"test": "wilcoxon", "files": len(log_ratios), "ratio": ratio,
+            "p": p}
+
+
+def main(baseline_dir, current_dir, metrics, alpha=0.01, min_change=0.05,
+         export_path=None):
+
+    matched = load_matched_benchmarks(baseline_dir, current_dir)
+    if not matched:
+        print("no benchmark files in both directories", file=sys.stderr)
+        return 2
+
+    rows = []
+    for group, pairs in sorted(matched.items()):
+        for metric in metrics:
+            # the tool is the last directory or the file name of the group
+            tool_name = os.path.splitext(group.split("/")[-1])[0]
+            row = {"group": group, "program": tool_name, "metric": metric,
+                   **compare_tool(pairs, metric)}
+            row["regression"] = bool(row["p"] < alpha
+                                     and row["ratio"] > 1 + min_change)
+            rows.append(row)
+    df = pd.DataFrame(rows)
+    if export_path is not None:
+        df.to_csv(export_path, index=False)
+    print(df.to_string(index=False))
+
+    regressions = df[df["regression"]]
+    for _, row in regressions.iterrows():
+        print(f"REGRESSION: {row['metric']} of {row['group']} increased "
+              f"by {(row['ratio'] - 1) * 100:.1f}% (p = {row['p']:.2g})",
+              file=sys.stderr)
+    return 1 if len(regressions) else 0
+
+
+if __name__ == "__main__":
+
+    args = parse_arguments()
+    sys.exit(main(*args))
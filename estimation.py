@@ -0,0 +1,313 @@
+# This file contains the functions that are used by the python scripts in
+# the subfolders to estimate the results from a sample of the templates,
+# together with confidence intervals
+
+import numpy as np
+import scipy.stats as st
+
+
+# confidence level of all intervals: 1 - ALPHA
+ALPHA = 0.05
+
+
+def splitmix64(x):
+    """
+    Hashes an array of integers with the splitmix64 finalizer. Returns
+    uint64 values that are uniformly distributed, but fully determined by
+    the input.
+    """
+    z = np.asarray(x, dtype=np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+    with np.errstate(over='ignore'):
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+def sample_order(ntemplates, seed=0):
+    """
+    Returns the template IDs in hash order. Any prefix of this order is a
+    uniform random sample of the templates, and it is the same sample for
+    all tools that are evaluated against the same templates.
+    """
+    ids = np.arange(ntemplates, dtype=np.uint64)
+    return np.argsort(splitmix64(ids ^ np.uint64(seed)), kind='stable')
+
+
+def binomial_ci(n, k, alpha=ALPHA):
+    """
+    Exact (Clopper-Pearson) confidence interval of the proportion k/n,
+    for a number or an array of counts k
+    https://sigmazone.com/binomial-confidence-intervals/
+    """
+    k = np.minimum(np.asarray(k, dtype=np.float64), n)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        p_lower = st.beta.ppf(alpha/2, k, n-k+1)
+        p_upper = st.beta.ppf(1-(alpha/2), k+1, n-k)
+    p_lower = np.where(k == 0, 0.0, p_lower)
+    p_upper = np.where(k == n, 1.0, p_upper)
+    return p_lower, p_upper
+
+
+def _widest_interval(nsampled, merged_cnt, edit_dist_counts, alpha):
+    """
+    Width of the widest confidence interval of the merge rate and of the
+    proportion of templates in each observed edit distance bin
+    """
+    counts = np.append(edit_dist_counts[edit_dist_counts > 0], merged_cnt)
+    p_lower, p_upper = binomial_ci(nsampled, counts, alpha)
+    return float(np.max(p_upper - p_lower))
+
+
+def sequential_sample(ntemplates, read_ids, get_edit_distances, sample_size,
+                      target_ci=None, alpha=ALPHA, seed=0):
+    """
+    Evaluates the merged reads of the templates in hash order (see
+    sample_order), in rounds that double the number of sampled templates.
+    Stops after the first round of sample_size templates if no target_ci
+    is given, otherwise as soon as the confidence intervals of the merge
+    rate and of the proportion of templates in each edit distance bin are
+    at most target_ci wide, or when all templates are evaluated.
+
+    read_ids holds the template ID of each merged read, and
+    get_edit_distances(read_indices) must return the edit distances of
+    the merged reads at these indices.
+
+    Returns the number of sampled templates, the indices of the sampled
+    merged reads and their edit distances.
+    """
+    rank = np.empty(ntemplates, dtype=np.int64)
+    rank[sample_order(ntemplates, seed)] = np.arange(ntemplates)
+    read_ranks = rank[read_ids]
+
+    sampled = []
+    edit_distances = []
+    nsampled = 0
+    round_size = max(1, min(sample_size, ntemplates))
+    while nsampled < ntemplates:
+        stop = min(nsampled + round_size, ntemplates)
+        indices = np.flatnonzero((read_ranks >= nsampled)
+                                 & (read_ranks < stop))
+        sampled.append(indices)
+        edit_distances.append(np.asarray(get_edit_distances(indices),
+                                         dtype=np.int64))
+        round_size = stop
+        nsampled = stop
+
+        if target_ci is None:
+            break
+        edit_dist_counts = np.bincount(np.concatenate(edit_distances))
+        width = _widest_interval(nsampled, edit_dist_counts.sum(),
+                                 edit_dist_counts, alpha)
+        print(f"sampled {nsampled} templates, widest interval: {width:.4f}")
+        if width <= target_ci:
+            break
+
+    return nsampled, np.concatenate(sampled), np.concatenate(edit_distances)
+
+
+def scale_counts(counts, nsampled, ntotal, alpha=ALPHA):
+    """
+    Scales counts that were observed on nsampled templates up to all
+    ntotal templates. Returns the estimated counts and the lower and
+    upper bounds of their confidence intervals, rounded to integers.
+    """
+    counts = np.asarray(counts, dtype=np.float64)
+    p_lower, p_upper = binomial_ci(nsampled, counts, alpha)
+    return tuple(
+        np.rint(np.asarray(p) * ntotal).astype(np.int64)
+        for p in (counts / nsampled, p_lower, p_upper)
+        )
+
+
+def make_counts_string(bins, counts):
+    """ Returns a dict-like string of the counts of the given bins """
+    return " ".join(f"{b}:{count}" for b, count in zip(bins, counts))
+
+
+def sample_estimates(edit_distances, nsampled, ntotal, alpha=ALPHA):
+    """
+    Estimates the number of merged reads and the edit distance counts of
+    all ntotal templates from the edit distances of the merged reads of
+    nsampled templates. Returns a dict with the estimates and the bounds
+    of their confidence intervals (*_lower, *_upper), the edit distance
+    counts as dict-like strings.
+    """
+    estimates = {'sampled_templates': nsampled}
+    merged = scale_counts(len(edit_distances), nsampled, ntotal, alpha)
+    for suffix, value in zip(("", "_lower", "_upper"), merged):
+        estimates["total_reads" + suffix] = int(value)
+    edit_dist_counts = np.bincount(edit_distances)
+    bins = np.flatnonzero(edit_dist_counts)
+    counts = scale_counts(edit_dist_counts[bins], nsampled, ntotal, alpha)
+    for suffix, values in zip(("", "_lower", "_upper"), counts):
+        estimates["edit_distances" + suffix] = make_counts_string(bins, values)
+    return estimates
+
+
+# Poisson bootstrap ---------------------------------------------------------
+
+
+# cumulative distribution function of Poisson(1), the bootstrap weights
+_POISSON_CDF = np.cumsum([np.exp(-1) / np.prod(np.arange(1, k + 1))
+                          for k in range(20)])
+
+
+def poisson_weights(template_ids, nreplicates, seed=0):
+    """
+    Returns the Poisson(1) bootstrap weights of the given templates in
+    each replicate, a uint8 array of shape (len(template_ids), 
+    nreplicates).
+    The weights are computed from a hash of the template ID and the
+    replicate, so the same template always gets the same weights and no
+    random state has to be stored.
+    """
+    template_ids = np.asarray(template_ids, dtype=np.uint64)
+    keys = (template_ids[:, None] * np.uint64(nreplicates) 
+            + np.arange(nreplicates, dtype=np.uint64))
+    hashes = splitmix64(keys ^ splitmix64(seed))
+    # uniform numbers in [0, 1) from the upper 53 bits of the hashes
+    uniform = (hashes >> np.uint64(11)) * 2.0**-53
+    # at most len(_POISSON_CDF)
+    return np.searchsorted(_POISSON_CDF, uniform, 
+                           side='right').astype(np.uint8)
+
+
+class PoissonBootstrap:
+    """
+    Accumulates the edit distance counts of the merged reads in a number
+    of Poisson bootstrap replicates, without storing anything per read.
+    Each template is weighted in each replicate by a Poisson(1) number
+    (see poisson_weights), and the replicate results are scaled to the
+    number of templates. The percentiles of the replicates give the
+    confidence intervals of the results.
+    The weights are computed in chunks of about chunk_size weights 
+    (templates times replicates), so the temporary arrays take a few 
+    ten MB, independent of the number of replicates.
+    """
+
+    def __init__(self, ntemplates, nreplicates=100, seed=0, 
+                 chunk_size=2**20):
+        self.ntemplates = ntemplates
+        self.nreplicates = nreplicates
+        self.seed = seed
+        # number of templates per chunk
+        self.chunk_size = max(1, chunk_size // nreplicates)
+        self._template_weights = None
+        # weighted edit distance counts, shape (nreplicates, max + 1)
+        self.edit_dist_weights = np.zeros((nreplicates, 0), dtype=np.int64)
+        self.edit_dist_counts = np.zeros(0, dtype=np.int64)
+
+    def _grow(self, size):
+        """ Makes room for edit distances up to size - 1 """
+        if size > len(self.edit_dist_counts):
+            extra = size - len(self.edit_dist_counts)
+            self.edit_dist_weights = np.pad(self.edit_dist_weights,
+                                            ((0, 0), (0, extra)))
+            self.edit_dist_counts = np.pad(self.edit_dist_counts, (0, extra))
+
+    def add(self, template_ids, edit_distances):
+        """
+        Adds the edit distances of merged reads, given the template ID of
+        each read
+        """
+        template_ids = np.asarray(template_ids)
+        edit_distances = np.asarray(edit_distances, dtype=np.int64)
+        if len(edit_distances) == 0:
+            return
+        size = int(edit_distances.max()) + 1
+        self._grow(size)
+        self.edit_dist_counts[:size] += np.bincount(edit_distances, 
+                                                    minlength=size)
+        replicate_offsets = size * np.arange(self.nreplicates)
+        for start in range(0, len(edit_distances), self.chunk_size):
+            stop = start + self.chunk_size
+            weights = poisson_weights(template_ids[start:stop], 
+                                      self.nreplicates, self.seed)
+            bins = edit_distances[start:stop, None] + replicate_offsets
+            counts = np.bincount(bins.ravel(), weights=weights.ravel(), 
+                                 minlength=size * self.nreplicates)
+            self.edit_dist_weights[:, :size] += (
+                counts.reshape(self.nreplicates, size).astype(np.int64))
+
+    def template_weights(self):
+        """
+        Total weight of all templates in each replicate. It is computed
+        once, when the intervals are needed, and then kept.
+        """
+        if self._template_weights is None:
+            self._template_weights = np.zeros(self.nreplicates, 
+                                              dtype=np.int64)
+            for start in range(0, self.ntemplates, self.chunk_size):
+                ids = np.arange(start, 
+                                min(start + self.chunk_size, self.ntemplates))
+                self._template_weights += poisson_weights(
+                    ids, self.nreplicates, self.seed).sum(axis=0, 
+                                                          dtype=np.int64)
+        return self._template_weights
+
+    def get_state(self):
+        """ Returns the accumulated counts, e.g. to save a checkpoint """
+        return {
+            'edit_dist_weights': self.edit_dist_weights,
+            'edit_dist_counts': self.edit_dist_counts,
+            }
+
+    def set_state(self, state):
+        """ Restores the counts returned by get_state """
+        self.edit_dist_counts = np.array(state['edit_dist_counts'], 
+                                         dtype=np.int64)
+        self.edit_dist_weights = np.array(
+            state['edit_dist_weights'], dtype=np.int64).reshape(
+                self.nreplicates, len(self.edit_dist_counts))
+
+    def merge_state(self, state):
+        """
+        Adds the counts of another PoissonBootstrap of the same templates,
+        e.g. of a worker process, returned by its get_state
+        """
+        counts = np.asarray(state['edit_dist_counts'], dtype=np.int64)
+        self._grow(len(counts))
+        self.edit_dist_counts[:len(counts)] += counts
+        self.edit_dist_weights[:, :len(counts)] += np.asarray(
+            state['edit_dist_weights'], dtype=np.int64).reshape(
+                self.nreplicates, len(counts))
+
+    def replicate_counts(self):
+        """
+        Edit distance counts of each replicate, scaled to the number of
+        templates, shape (nreplicates, max edit distance + 1)
+        """
+        return (self.edit_dist_weights * self.ntemplates 
+                / np.maximum(self.template_weights(), 1)[:, None])
+
+    def intervals(self, nfrags, fraglen=None, alpha=ALPHA):
+        """
+        Returns a dict with the bounds of the percentile intervals of
+        the number of merged and dropped reads, the average divergence
+        per nt (if fraglen is given) and the edit distance counts, the
+        latter as dict-like strings.
+        """
+        quantiles = (alpha/2, 1-(alpha/2))
+        counts = self.replicate_counts()
+        total_reads = counts.sum(axis=1)
+        lower, upper = np.rint(np.quantile(total_reads, quantiles))
+        intervals = {
+            'bootstrap_replicates': self.nreplicates,
+            'total_reads_lower': int(lower),
+            'total_reads_upper': int(upper),
+            'dropped_reads_lower': nfrags - int(upper),
+            'dropped_reads_upper': nfrags - int(lower),
+            }
+        if fraglen is not None:
+            with np.errstate(invalid='ignore', divide='ignore'):
+                divergence = (counts @ np.arange(counts.shape[1]) 
+                              / total_reads / fraglen * 100)
+            lower, upper = np.round(np.nanquantile(divergence, quantiles), 3)
+            intervals['avg_divergence_per_nt_lower'] = lower
+            intervals['avg_divergence_per_nt_upper'] = upper
+        bins = np.flatnonzero(self.edit_dist_counts)
+        lower, upper = np.rint(np.quantile(counts[:, bins], quantiles, 
+                                           axis=0)).astype(np.int64)
+        intervals['edit_distances_lower'] = make_counts_string(bins, lower)
+        intervals['edit_distances_upper'] = make_counts_string(bins, upper)
+        return intervals
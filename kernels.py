@@ -0,0 +1,52 @@
+# This file contains numba-compiled versions of the hottest loops of the
+# python scripts in the subfolders. numba is optional: if it can not be
+# imported, NUMBA_AVAILABLE is False and the scripts use their own pure
+# python loops, which are the reference implementation (see 
+# tests/test_kernels.py for the check that both give the same results).
+
+import numpy as np
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        """ Stand-in for numba.njit, returns the function unchanged """
+        def decorator(function):
+            return function
+        return decorator
+
+
+def as_uint8(seqs):
+    """ Concatenates a list of byte strings to one uint8 array """
+    return np.frombuffer(b''.join(seqs), dtype=np.uint8)
+
+
+@njit(cache=True, nogil=True)
+def count_matches_by_quality(read_seq, read_qual, template_seq):
+    """
+    Compares the bases of the (concatenated) merged reads with the bases
+    of their templates at the same position, all uint8 arrays of the
+    same length. Returns the number of matching and mismatching bases
+    for each quality byte, as two arrays of length 256.
+    """
+    match_cnt = np.zeros(256, dtype=np.int64)
+    mismatch_cnt = np.zeros(256, dtype=np.int64)
+    for i in range(len(read_seq)):
+        if read_seq[i] == template_seq[i]:
+            match_cnt[read_qual[i]] += 1
+        else:
+            mismatch_cnt[read_qual[i]] += 1
+    return match_cnt, mismatch_cnt
+
+
+@njit(cache=True, nogil=True)
+def count_bytes(data):
+    """ Returns the number of occurences of each byte value """
+    counts = np.zeros(256, dtype=np.int64)
+    for i in range(len(data)):
+        counts[data[i]] += 1
+    return counts
+
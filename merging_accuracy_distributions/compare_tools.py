@@ -0,0 +1,220 @@
+#!/usr/bin/python3
+
+"""
+Compares the merged reads of several tools for the same simulated
+dataset. The templates and the merged reads of all tools are 
+hash-partitioned into buckets on disk and joined bucket by bucket (see
+common.multiway_join), so the order of the reads does not matter and
+reads that do not belong to any template are skipped.
+
+Output:
+- {out}_masks.npy: per-template bitmasks, indexed by template ID.
+  Column 0 has a bit set for every tool that merged the template,
+  column 1 for every tool that reconstructed it without errors. Bit i
+  belongs to the i-th tool.
+- {out}_agreement.csv: number of templates for each bitmask
+- {out}_disagreement.csv: tool-by-tool matrix, the number of templates
+  that the tool of the row reconstructed without errors and the tool of
+  the column did not.
+"""
+
+
+import sys
+import os
+import argparse
+import numpy as np
+import pandas as pd
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+import common
+
+
+TOOLNAMES = [
+    "leeHom", "AdapterRemoval", "ClipAndMerge", "seqtk_adna_trim",
+    "bbmerge", "fastp", "SeqPrep"
+    ]
+# the file extension of the merged reads of each tool in the 
+# reconstruction directory, as written by the snakefile
+MERGED_SUFFIXES = {
+    "leeHom": ".fq.gz",
+    "AdapterRemoval": ".fq",
+    "ClipAndMerge": ".fq",
+    "seqtk_adna_trim": ".fq",
+    "bbmerge": ".fq",
+    "fastp": ".fq",
+    "SeqPrep": ".fq.gz",
+    }
+
+
+def parse_arguments():
+    """
+    """
+    parser = argparse.ArgumentParser(
+        description="Compares the merged reads of all tools for one "
+                    "simulated dataset. The merged reads are either given "
+                    "with --mreads/--tools, or found in the reconstruction "
+                    "directory as {recdir}/{tool}/{basename}_merged.fq or "
+                    "{recdir}/{tool}/{basename}_merged.fq.gz.")
+
+    # required arguments
+    parser.add_argument(
+        "-in1", "--templates", action="store", type=str, required=True,
+        dest="templates_path", help='gzipped or unzipped fasta file of '
+                                    'the simulated DNA templates. ')
+    parser.add_argument(
+        "-o", "--out", action="store", type=str, required=True,
+        dest="out_prefix", help="Prefix for the output files")
+
+    # optional arguments
+    parser.add_argument(
+        "-in2", "--mreads", action="store", type=str, nargs="+",
+        dest="readm_paths", help='gzipped or unzipped fastq files of the '
+                                 'merged reads, one per tool')
+    parser.add_argument(
+        "-t", "--tools", action="store", type=str, nargs="+",
+        default=TOOLNAMES, dest="tool_names",
+        help="Names of the tools, in the order of --mreads")
+    parser.add_argument(
+        "-r", "--recdir", action="store", type=str,
+        help="reconstruction directory with one subdirectory per tool")
+    parser.add_argument(
+        "-b", "--basename", action="store", type=str,
+        help="name of the dataset, e.g. gen_n_1000000_dist_A9180_qs_0")
+    parser.add_argument(
+        "-s", "--seperator", action="store", type=str, default="-",
+        help="this character and all charaters to the right of it will be "
+             "removed from the fastq headers (default: -)")
+    parser.add_argument(
+        "--nbuckets", action="store", type=int, default=16,
+        help="Number of buckets of the join. Only the templates and merged "
+             "reads of one bucket are in memory at a time (default: 16)")
+
+    args = parser.parse_args()
+    if args.readm_paths is None:
+        if args.recdir is None or args.basename is None:
+            parser.error("either --mreads or --recdir and --basename must "
+                         "be given")
+        args.readm_paths = [
+            find_merged_reads(args.recdir, tool_name, args.basename)
+            for tool_name in args.tool_names
+            ]
+    if len(args.readm_paths) != len(args.tool_names):
+        parser.error("--mreads and --tools must have the same length")
+
+    arguments = [
+        args.templates_path,
+        args.readm_paths,
+        args.tool_names,
+        args.out_prefix,
+        args.seperator.encode(),
+        args.nbuckets,
+        ]
+    return arguments
+
+
+def find_merged_reads(recdir, tool_name, basename):
+    """
+    Returns the path of the merged reads of a tool in the reconstruction
+    directory. The file extension of the snakefile is tried first, then 
+    the other one, if only that file exists.
+    """
+    suffix = MERGED_SUFFIXES.get(tool_name, ".fq.gz")
+    other_suffix = ".fq" if suffix == ".fq.gz" else ".fq.gz"
+    path = os.path.join(recdir, tool_name, f"{basename}_merged{suffix}")
+    other_path = os.path.join(recdir, tool_name, 
+                              f"{basename}_merged{other_suffix}")
+    if not os.path.exists(path) and os.path.exists(other_path):
+        return other_path
+    return path
+
+
+def _add_masks(masks, merged_counts, correct_counts, disagreement):
+    """
+    Adds (merged-bitmask, correct-bitmask) rows to the counts and the 
+    tool-by-tool disagreements
+    """
+    merged_counts += np.bincount(masks[:, 0], minlength=len(merged_counts))
+    correct_counts += np.bincount(masks[:, 1], minlength=len(correct_counts))
+    ntools = len(disagreement)
+    correct = (masks[:, 1, None].astype(np.int64) >> np.arange(ntools)) & 1
+    disagreement += correct.T @ (1 - correct)
+
+
+def compare_tools(join, ntools, masks_path):
+    """
+    Builds the merged- and correct-bitmasks of every template, bucket by
+    bucket, and writes them to a memory-mapped .npy file at the rows of
+    their template IDs. Returns the number of templates, the number of 
+    templates per merged-bitmask and per correct-bitmask, and the 
+    disagreement matrix.
+    """
+    dtype = np.min_scalar_type(2**ntools - 1)
+    merged_counts = np.zeros(2**ntools, dtype=np.int64)
+    correct_counts = np.zeros(2**ntools, dtype=np.int64)
+    disagreement = np.zeros((ntools, ntools), dtype=np.int64)
+    masks = np.lib.format.open_memmap(masks_path, mode='w+', dtype=dtype,
+                                      shape=(join.nrecords, 2))
+
+    for bucket in range(join.nbuckets):
+        template_ids = []
+        bucket_masks = []
+        for template_id, template_seq, read_seqs \
+                in join.bucket_multiway(bucket):
+            merged_mask = 0
+            correct_mask = 0
+            for i, read_seq in enumerate(read_seqs):
+                if read_seq is not None:
+                    merged_mask |= 1 << i
+                    if read_seq == template_seq:
+                        correct_mask |= 1 << i
+            template_ids.append(template_id)
+            bucket_masks.append((merged_mask, correct_mask))
+        bucket_masks = np.array(bucket_masks, dtype=dtype).reshape(-1, 2)
+        masks[template_ids] = bucket_masks
+        _add_masks(bucket_masks, merged_counts, correct_counts, disagreement)
+    masks.flush()
+    del masks
+
+    return join.nrecords, merged_counts, correct_counts, disagreement
+
+
+def main(template_path, readm_paths, tool_names, out_prefix, seperator,
+         nbuckets=16):
+
+    # Analysis and export of the bitmasks -------------------------------------
+
+    join = common.multiway_join(template_path, readm_paths, seperator, 
+                                tool_names, nbuckets)
+    try:
+        result = compare_tools(join, len(tool_names), 
+                               out_prefix + "_masks.npy")
+        ntemplates, merged_counts, correct_counts, disagreement = result
+    finally:
+        join.close()
+
+    # Export results ----------------------------------------------------------
+
+    masks = np.flatnonzero(merged_counts + correct_counts)
+    df = pd.DataFrame({
+        'mask': masks,
+        'tools': [
+            ";".join(tool_name for i, tool_name in enumerate(tool_names)
+                     if mask >> i & 1)
+            for mask in masks
+            ],
+        'n_merged': merged_counts[masks],
+        'n_correct': correct_counts[masks],
+        })
+    df.to_csv(out_prefix + "_agreement.csv", index=False)
+
+    df = pd.DataFrame(disagreement, index=tool_names, columns=tool_names)
+    df.to_csv(out_prefix + "_disagreement.csv")
+
+    print(f"total templates: {ntemplates}")
+    print(f"not merged by any tool: {merged_counts[0]}")
+    print(f"not reconstructed by any tool: {correct_counts[0]}")
+
+
+if __name__ == "__main__":
+
+    args = parse_arguments()
+    main(*args)
@@ -8,7 +8,6 @@ Annette Lien (a.lien@posteo.de) (12.09.2022)
 
 import sys
 import os
-import edlib
 import argparse
 sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
 import common 
@@ -48,9 +47,15 @@ def parse_arguments():
         dest="export_path", help="Path for the output csv file")
     parser.add_argument(
         "-t", "--tool", action="store", type=str, required=True,
-        dest="tool_name", help="Name of the tool used for trimming")
-
+        dest="tool_name", help="Name of the tool used for trimming, "
+                                "selects how the read headers are cleaned up")
+    
+    # optional arguments
+    common.add_evaluation_arguments(parser)
+    common.add_run_arguments(parser)
+    
     args = parser.parse_args()
+    common.check_evaluation_arguments(parser, args)
     arguments = [
         args.templates_path, 
         args.readm_path,
@@ -58,70 +63,58 @@ def parse_arguments():
         args.fraglendist,
         args.qualityshift,
         args.export_path, 
-        args.tool_name
+        args.tool_name,
+        args,
         ]
     
     return arguments
 
 
-def _levenshtein_distance(template_seq, read_seq):
+def main(template_path, readm_path, nfrags, distname, qs, export_path, 
+         tool_name, options=None):
     """
-    count how many nucleotides are different, use edlib's levenshtein
-    algo for edit distance
+    options: the optional arguments of the evaluation, see 
+    common.evaluation_options
     """
-    return edlib.align(template_seq, read_seq)['editDistance']
-
-
-def get_edit_distances(merged_reads, templates):
-    edit_distances = []
-    for read in merged_reads:
-        read_seq = read['sequence']
-        template_seq = templates[read['name']]['sequence']
-        edit_distances.append(_levenshtein_distance(template_seq, read_seq))  
-    return edit_distances
-
-
-def make_edit_distances_string(edit_dist_list):
-    """Counts the occurence of each edit distance and returns a 
-    dict-like string""" 
-    edit_dist_string = ""
-    for edit_dist in sorted(set(edit_dist_list)):
-        edit_dist_string += f"{edit_dist}:"
-        edit_dist_string += f"{edit_dist_list.count(edit_dist)} "
-    return edit_dist_string
-
-
-def main(template_path, readm_path, nfrags, distname, qs, export_path, 
-         tool_name):
-
-    # Load files --------------------------------------------------------------
+    if options is None:
+        options = common.evaluation_options()
+    common.set_progress_interval(options.progress_interval)
+    profiler = common.StageProfiler(
+        export_path + ".profile.json" if options.profile else None,
+        export_path + ".prof" if options.cprofile else None)
 
-    templates = common.load_fasta(template_path)
+    # Load files and analysis -------------------------------------------------
 
-    # Check for duplicate fragments
-    # if len(templates) != nfrags:
-    #     print(f"ATTENTION: number of total_sequences is {len(templates)}, " 
-    #           f"but the nfrags is {nfrags}. Possible reason: duplicate "
-    #           "fragments")
-
-    reads = common.load_fastq(readm_path)
     # seperator: this character and all charaters to the right of it
     # will be removed from the fastq header
     seperator = b'-'
-    reads = common.clean_merged_reads(reads, templates, seperator)
-
-    # Analysis and Results ----------------------------------------------------
-
-    # edit distances of all reads
-    edit_dist_list = get_edit_distances(reads, templates)
-    edit_dist_string = make_edit_distances_string(edit_dist_list)
+    checkpoint = None
+    if options.checkpoint_path is not None:
+        inputs = [template_path, readm_path, tool_name, nfrags, 
+                  options.aligner, options.max_edit_dist, options.nbootstrap]
+        checkpoint = common.Checkpoint(options.checkpoint_path, inputs, 
+                                       options.checkpoint_interval)
+    results = common.evaluate_edit_distances(
+        template_path, readm_path, nfrags, seperator, tool_name, options, 
+        None, checkpoint, profiler)
+    ntemplates = results['ntemplates']
+    edit_dist_counts = results['edit_dist_counts']
+    total_reads_cnt = results['total_reads']
+    edit_dist_string = results['edit_distances']
+    interval_columns = results['interval_columns']
+    # Check for duplicate fragments
+    # if ntemplates != nfrags:
+    #     print(f"ATTENTION: number of total_sequences is {ntemplates}, " 
+    #           f"but the nfrags is {nfrags}. Possible reason: duplicate "
+    #           "fragments")
     # Number of dropped reads
     # Comment: why take the length of templates and not nfrags?
-    dropped_reads_cnt = nfrags - len(reads)
+    dropped_reads_cnt = nfrags - total_reads_cnt
 
 
     #################### export results ####################
-            
+
+    profiler.start("export")
     with open(export_path, 'w') as f:
         f.write(
             "program,"
@@ -133,20 +126,31 @@ def main(template_path, readm_path, nfrags, distname, qs, export_path,
             "total_reads,"
             "dropped_reads,"
             "edit_distances"
-            "\n")
+            + "".join(f",{column}" for column in interval_columns)
+            + "\n")
         f.write(f"{tool_name},"
                 f"{os.path.basename(readm_path)},"
                 f"{nfrags},"
                 f"{distname},"
                 f"{qs},"
-                f"{len(templates)},"
-                f"{len(reads)},"
+                f"{ntemplates},"
+                f"{total_reads_cnt},"
                 f"{dropped_reads_cnt},"
                 f"{edit_dist_string.rstrip()}"
+                + "".join(f",{value}" for value in interval_columns.values())
                 )
 
+    # per-template results
+    if results['template_arrays'] is not None:
+        common.save_template_arrays(options.arrays_prefix, 
+                                    results['template_arrays'])
+
+    if checkpoint is not None:
+        checkpoint.remove()
+    profiler.save()
+
 
 if __name__ == "__main__":
 
     args = parse_arguments()
-    main(*args)
\ No newline at end of file
+    main(*args)
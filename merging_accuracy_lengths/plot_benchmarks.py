@@ -0,0 +1,162 @@
+import sys
+import os
+import re
+import glob
+import argparse
+import pandas as pd
+import scipy.stats as st
+from matplotlib import pyplot as plt
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+import benchmarking
+from plot import break_xaxis
+
+
+# read length of the simulated paired-end reads
+READ_LENGTH = 125
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description="Collects the benchmarks of the merging tools for all "
+        "insert lengths and plots the time, memory and io against the "
+        "insert length")
+
+    parser.add_argument(
+        "-i", action="store", type=str, required=False, dest="benchmark_dir",
+        default="output/benchmarks",
+        help="directory with the benchmark files, which are in "
+        "{tool}/gen_n{nfrags}_l{fraglen}_*.tsv (default: output/benchmarks)")
+    parser.add_argument(
+        "-o", action="store", type=str, required=False, dest="outfile",
+        default="output/evaluation/benchmarks.csv",
+        help="path for the csv file with all benchmarks "
+        "(default: output/evaluation/benchmarks.csv)")
+    parser.add_argument(
+        "-s", action="store", type=str, required=False, dest="summary_file",
+        default="output/evaluation/benchmarks_summary.csv",
+        help="path for the csv file with one summary row per tool "
+        "(default: output/evaluation/benchmarks_summary.csv)")
+    parser.add_argument(
+        "-p", action="store", type=str, required=False, dest="outdir",
+        default="output/plots",
+        help="path of the output directory for the plot "
+        "(default: output/plots)")
+
+    args = parser.parse_args()
+    return args.benchmark_dir, args.outfile, args.summary_file, args.outdir
+
+
+def overlap_length(fraglen):
+    """
+    Number of bases in which the forward and the reverse read overlap:
+    the whole insert if it is shorter than the reads, and nothing if it
+    is longer than both reads together
+    """
+    return max(0, min(fraglen, 2 * READ_LENGTH - fraglen))
+
+
+def load_benchmarks(benchmark_dir):
+    """
+    Reads all benchmark files of the reconstructions into one table,
+    with one row per tool and insert length
+    """
+    rows = []
+    pattern = os.path.join(benchmark_dir, "*", "gen_n*_l*_*.tsv")
+    for path in glob.glob(pattern):
+        match = re.fullmatch(r"gen_n(\d+)_l(\d+)_\w+\.tsv",
+                             os.path.basename(path))
+        if match is None:
+            continue
+        nfrags, fraglen = int(match.group(1)), int(match.group(2))
+        summary = benchmarking.summarize_benchmark(
+            benchmarking.read_benchmark(path))
+        rows.append({
+            "program": os.path.basename(os.path.dirname(path)),
+            "nfrags": nfrags,
+            "fraglen": fraglen,
+            "overlap": overlap_length(fraglen),
+            **summary,
+            })
+    df = pd.DataFrame(rows)
+    df["io"] = df["io_in"] + df["io_out"]
+    return df.sort_values(["program", "fraglen"], ignore_index=True)
+
+
+def summarize_tools(df):
+    """
+    Returns one row per tool with the range of the time and the memory,
+    and the change of the time per base of overlap (slope of a linear
+    regression for the insert lengths with an overlap)
+    """
+    rows = []
+    for program, df_program in df.groupby("program"):
+        overlapping = df_program[df_program["overlap"] > 0]
+        fit = st.linregress(overlapping["overlap"], overlapping["s"])
+        rows.append({
+            "program": program,
+            "lengths": len(df_program),
+            "s_min": df_program["s"].min(),
+            "s_median": df_program["s"].median(),
+            "s_max": df_program["s"].max(),
+            "s_per_overlap_nt": fit.slope,
+            "s_overlap_r": fit.rvalue,
+            "max_rss_min": df_program["max_rss"].min(),
+            "max_rss_max": df_program["max_rss"].max(),
+            "io_median": df_program["io"].median(),
+            })
+    return pd.DataFrame(rows)
+
+
+def plot_benchmarks(df, outdir):
+
+    columns = [
+        ("s", "Wall clock time (s)"),
+        ("max_rss", "Maximum RSS (MB)"),
+        ("io", "Read and written (MB)"),
+        ]
+    fig, axes = plt.subplots(len(columns), 2, sharey='row', facecolor='w',
+                             figsize=[12, 4 * len(columns)],
+                             gridspec_kw={'width_ratios': [0.95, 0.05]})
+
+    for (column, label), (ax1, ax2) in zip(columns, axes):
+        for program, df_program in df.groupby("program"):
+            for ax in (ax1, ax2):
+                ax.plot(df_program["fraglen"], df_program[column],
+                        label=program, lw=1, marker='.', markersize=3)
+        break_xaxis(ax1, ax2, (0, 253), (997, 1003))
+        ax2.set_xticks([1000])
+        ax1.set_xticks(range(0, 251, 10))
+        # Add a line at the read length
+        ax1.axvline(READ_LENGTH + 0.5, color='green', linestyle='--', lw=1)
+        ax1.grid(alpha=0.5)
+        ax2.grid(alpha=0.5)
+        ax1.set_ylabel(label, fontsize=14)
+    axes[-1][0].set_xlabel('DNA insert length', fontsize=14)
+    axes[0][1].legend(fontsize=12, loc='upper left',
+                      bbox_to_anchor=(1.5, 1))
+
+    fig.subplots_adjust(wspace=0.03)
+    fig.tight_layout()
+    plt.savefig(f"{outdir}/benchmarks_by_length.png",
+                dpi='figure',
+                format="png")
+
+
+def main(benchmark_dir, outfile, summary_file, outdir):
+
+    df = load_benchmarks(benchmark_dir)
+    columns = ["program", "nfrags", "fraglen", "overlap", "s", "cpu_time",
+               "max_rss", "max_uss", "io_in", "io_out", "io"]
+    df[columns].to_csv(outfile, index=False)
+
+    summary = summarize_tools(df)
+    summary.to_csv(summary_file, index=False)
+    print(summary.to_string(index=False))
+
+    plot_benchmarks(df, outdir)
+
+
+if __name__ == "__main__":
+
+    args = parse_arguments()
+    main(*args)
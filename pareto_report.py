@@ -0,0 +1,189 @@
+#!/usr/bin/python3
+
+"""
+Joins the cost of the merging tools (throughput and maximum USS from the
+runtime_memory benchmarks) with their accuracy (fraction of merged reads
+and of perfectly reconstructed reads from the all_merged.csv of the
+merging_accuracy_* evaluations) into one table per tool, and marks the
+tools on the Pareto frontier: those that no other tool beats in all of
+throughput, memory, merged fraction and perfect fraction at once.
+With --min-throughput and --max-memory, the most accurate tool within
+that budget is reported.
+"""
+
+
+import argparse
+import os
+import pandas as pd
+import benchmarking
+
+
+BASEDIR = os.path.dirname(os.path.realpath(__file__))
+
+# objectives of the Pareto frontier, and whether more is better
+OBJECTIVES = {
+    "reads_per_s": True,
+    "max_uss": False,
+    "merged_fraction": True,
+    "perfect_fraction": True,
+    }
+
+
+def parse_arguments():
+    """
+    """
+    parser = argparse.ArgumentParser(
+        description="Joins the throughput and memory of the merging tools "
+                    "with their accuracy and computes the Pareto frontier.")
+
+    parser.add_argument(
+        "-b", "--benchmarks", action="store", type=str,
+        dest="benchmark_dir",
+        default=os.path.join(BASEDIR, "runtime_memory", "output",
+                             "benchmarks"),
+        help="Directory with the runtime_memory benchmarks, {tool}.tsv "
+             "(default: runtime_memory/output/benchmarks)")
+    parser.add_argument(
+        "-n", "--nfrags", action="store", type=int, default=1000000,
+        help="Number of read pairs of the benchmarked dataset "
+             "(default: 1000000)")
+    parser.add_argument(
+        "-a", "--accuracy", action="store", type=str, nargs="+",
+        dest="accuracy_paths",
+        default=[os.path.join(BASEDIR, "merging_accuracy_distributions",
+                              "output", "evaluation", "all_merged.csv")],
+        help="all_merged.csv files of the merging_accuracy_* evaluations, "
+             "the counts of all their rows are added up per tool (default: "
+             "merging_accuracy_distributions/output/evaluation/"
+             "all_merged.csv)")
+    parser.add_argument(
+        "-qs", "--qualityshift", action="store", type=int,
+        dest="quality_shift",
+        help="Only use the accuracy rows with this quality shift "
+             "(default: all rows)")
+    parser.add_argument(
+        "--min-throughput", action="store", type=float,
+        dest="min_throughput",
+        help="Throughput budget in read pairs per second")
+    parser.add_argument(
+        "--max-memory", action="store", type=float, dest="max_memory",
+        help="Memory budget in MB (maximum USS)")
+    parser.add_argument(
+        "-o", "--out", action="store", type=str, required=False,
+        dest="export_path", help="Path of the output csv file")
+
+    args = parser.parse_args()
+    arguments = [
+        args.benchmark_dir,
+        args.nfrags,
+        args.accuracy_paths,
+        args.quality_shift,
+        args.min_throughput,
+        args.max_memory,
+        args.export_path,
+        ]
+    return arguments
+
+
+def load_cost(benchmark_dir, nfrags):
+    """
+    Returns the median wall clock time, CPU time and maximum USS of the
+    benchmark repeats and the throughput, one row per tool
+    """
+    rows = []
+    for relpath, path in sorted(
+            benchmarking.find_benchmarks(benchmark_dir).items()):
+        # only the benchmarks of the merging tools, not the sweeps
+        if os.sep in relpath:
+            continue
+        summary = benchmarking.summarize_benchmark(
+            benchmarking.read_benchmark(path), ["s", "cpu_time", "max_uss"])
+        rows.append({"program": benchmarking.tool_of(relpath), **summary})
+    df = pd.DataFrame(rows)
+    df["reads_per_s"] = nfrags / df["s"]
+    return df
+
+
+def count_perfect_reads(edit_distances):
+    """ Returns the count of edit distance 0 from an edit_distances string """
+    if not isinstance(edit_distances, str):
+        return 0
+    for element in edit_distances.split():
+        edit_dist, cnt = element.split(":")
+        if int(edit_dist) == 0:
+            return int(cnt)
+    return 0
+
+
+def load_accuracy(accuracy_paths, quality_shift=None):
+    """
+    Returns the fraction of merged reads and of perfectly reconstructed
+    reads (edit distance 0) of all simulated read pairs, one row per tool
+    """
+    df = pd.concat([pd.read_csv(path) for path in accuracy_paths],
+                   ignore_index=True)
+    if quality_shift is not None:
+        df = df[df["quality_shift"] == quality_shift]
+    df = df.assign(perfect_reads=df["edit_distances"].map(
+        count_perfect_reads))
+    df = df.groupby("program", as_index=False)[
+        ["nfrags", "total_reads", "perfect_reads"]].sum()
+    df["merged_fraction"] = df["total_reads"] / df["nfrags"]
+    df["perfect_fraction"] = df["perfect_reads"] / df["nfrags"]
+    return df[["program", "merged_fraction", "perfect_fraction"]]
+
+
+def pareto_frontier(df, objectives=OBJECTIVES):
+    """
+    Returns a boolean series, True for the rows that are not dominated:
+    no other row is at least as good in all objectives and better in one
+    """
+    # more is better for all columns of values
+    values = pd.DataFrame({
+        column: df[column] if larger else -df[column]
+        for column, larger in objectives.items()
+        }).to_numpy()
+    frontier = []
+    for row in values:
+        dominated = ((values >= row).all(axis=1)
+                     & (values > row).any(axis=1)).any()
+        frontier.append(not dominated)
+    return pd.Series(frontier, index=df.index)
+
+
+def main(benchmark_dir, nfrags, accuracy_paths, quality_shift=None,
+         min_throughput=None, max_memory=None, export_path=None):
+
+    df = load_cost(benchmark_dir, nfrags).merge(
+        load_accuracy(accuracy_paths, quality_shift), on="program")
+    df["pareto"] = pareto_frontier(df)
+    df = df.sort_values("reads_per_s", ascending=False, ignore_index=True)
+    columns = ["program", "reads_per_s", "s", "cpu_time", "max_uss",
+               "merged_fraction", "perfect_fraction", "pareto"]
+    df = df[columns]
+    print(df.to_string(index=False))
+    if export_path is not None:
+        df.to_csv(export_path, index=False)
+
+    if min_throughput is not None or max_memory is not None:
+        budget = df
+        if min_throughput is not None:
+            budget = budget[budget["reads_per_s"] >= min_throughput]
+        if max_memory is not None:
+            budget = budget[budget["max_uss"] <= max_memory]
+        if budget.empty:
+            print("no tool is within the budget")
+        else:
+            best = budget.sort_values(
+                ["perfect_fraction", "merged_fraction"],
+                ascending=False).iloc[0]
+            print(f"most accurate tool within the budget: {best['program']} "
+                  f"({best['reads_per_s']:.0f} read pairs/s, "
+                  f"{best['max_uss']:.0f} MB, "
+                  f"{best['perfect_fraction']:.4f} perfect)")
+
+
+if __name__ == "__main__":
+
+    args = parse_arguments()
+    main(*args)
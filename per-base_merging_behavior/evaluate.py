@@ -31,6 +31,20 @@ def parse_arguments():
     parser.add_argument(
         "-t", "--tool", action="store", type=str, required=True,
         dest="program_name", help="Name of the program used for merging")
+    
+    # optional arguments
+    parser.add_argument(
+        "--profile", action="store_true", help="Save the wall clock time, "
+        "the CPU time and the peak RSS of the loading, the analysis and the "
+        "export to <out>.profile.json")
+    parser.add_argument(
+        "--cprofile", action="store_true", help="Also profile the whole run "
+        "with cProfile and dump the stats to <out>.prof (implies --profile)")
+    parser.add_argument(
+        "--progress", action="store", type=float, required=False,
+        dest="progress_interval", help="Print the reads processed, the "
+        "reads per second, the bytes decompressed and the RSS to stderr "
+        "every this many seconds (default: no progress)")
 
     args = parser.parse_args()
     arguments = [
@@ -39,6 +53,9 @@ def parse_arguments():
         args.merged_path,
         args.out_path, 
         args.program_name,
+        args.profile or args.cprofile,
+        args.cprofile,
+        args.progress_interval,
         ]
     return arguments
 
@@ -111,23 +128,34 @@ def analyze_merged_reads(merged_reads, s1_seqs, s2_seqs):
 
 
 
-def main(s1_path, s2_path, merged_path, out_path, program_name):
+def main(s1_path, s2_path, merged_path, out_path, program_name, 
+         profile=False, cprofile=False, progress_interval=None):
+
+    common.set_progress_interval(progress_interval)
+    profiler = common.StageProfiler(
+        out_path + ".profile.json" if profile else None,
+        out_path + ".prof" if cprofile else None)
     
     # Load files --------------------------------------------------------------
 
+    profiler.start("load")
     # initial fastq files
     s1_seqs = load_initial_fastq(s1_path)
     s2_seqs = load_initial_fastq(s2_path, rev_complement = True)
 
     # Merged reads
-    merged_reads = common.load_fastq(merged_path)
+    merged_reads = common.load_fastq(
+        merged_path, keep=common.is_merged_read, 
+        fields=('name', 'sequence', 'quality'))
     # seperator: this character and all charaters to the right of it
     # will be removed from the fastq header
     seperator = b'/'
-    merged_reads = common.clean_merged_reads(merged_reads, s1_seqs, seperator)
+    merged_reads = common.clean_merged_reads(merged_reads, s1_seqs, seperator,
+                                             program_name)
     
     # Analysis and Results ----------------------------------------------------
 
+    profiler.start("analysis")
     result = analyze_merged_reads(merged_reads, s1_seqs, s2_seqs)
     matching_nt = result[0]
     mismatching_nt = result[1]
@@ -143,6 +171,7 @@ def main(s1_path, s2_path, merged_path, out_path, program_name):
 
     # Export results -------------------------------------------------
         
+    profiler.start("export")
     print(f"{os.path.basename(merged_path)}:")
     print(f"total seqs: {len(s1_seqs)}")
     print(f"total merged: {len(merged_reads)}")
@@ -175,6 +204,7 @@ def main(s1_path, s2_path, merged_path, out_path, program_name):
     df3.to_csv(out_path, na_rep="NA")
 
     print("Data exported sucessfully\n")
+    profiler.save()
 
 
 if __name__ == "__main__":
@@ -1,8 +1,43 @@
 import os 
+import sys
+import numpy as np
 import pandas as pd
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+import kernels
 
 
 def count_phred_occurences(fastq_file):
+    """
+    Returns a list with the number of occurences of each phred score
+    (0-41) in the quality lines of an unzipped fastq file. Uses the numba
+    kernel if numba is installed. Raises a ValueError for phred scores
+    outside of 0-41.
+    """
+    if kernels.NUMBA_AVAILABLE:
+        return _count_phred_occurences_numba(fastq_file)
+    return _count_phred_occurences_python(fastq_file)
+
+
+def _count_phred_occurences_numba(fastq_file, chunk_size=100000):
+
+    byte_counter = np.zeros(256, dtype=np.int64)
+
+    with open(fastq_file, 'rb') as infile:
+        qualities = []
+        for _, _, _, quality in zip(infile, infile, infile, infile):
+            qualities.append(quality.rstrip())
+            if len(qualities) == chunk_size:
+                byte_counter += kernels.count_bytes(kernels.as_uint8(qualities))
+                qualities = []
+        byte_counter += kernels.count_bytes(kernels.as_uint8(qualities))
+
+    # phred scores 0-41, as in the python version
+    if byte_counter[:33].any() or byte_counter[33+42:].any():
+        raise ValueError(f"{fastq_file}: phred score out of range 0-41")
+    return byte_counter[33:33+42].tolist()
+
+
+def _count_phred_occurences_python(fastq_file):
     
     phred_counter = 42 * [0]
     
@@ -16,6 +51,9 @@ def count_phred_occurences(fastq_file):
             if cnt == 4:
                 for char in line:
                     qual = char - 33
+                    if not 0 <= qual < 42:
+                        raise ValueError(
+                            f"{fastq_file}: phred score out of range 0-41")
                     phred_counter[qual] += 1
                 cnt = 0 
                 
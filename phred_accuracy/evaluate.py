@@ -7,6 +7,7 @@ import pandas as pd
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
 import common
+import kernels
 import numpy as np
 import scipy.stats as st
 
@@ -52,8 +53,14 @@ def parse_arguments():
     parser.add_argument(
         "-t", "--tool", action="store", type=str, required=False,
         dest="tool_name", help="Name of the program used for trimming")
+    
+    # optional arguments for long running evaluations
+    common.add_run_arguments(parser)
 
     args = parser.parse_args()
+    common.check_run_arguments(parser, args)
+    if args.profile and args.export_path is None:
+        parser.error("--profile and --cprofile require --out")
     required_arguments = [
         args.templates_path, 
         args.readm_path,
@@ -62,13 +69,11 @@ def parse_arguments():
         args.qualityshift,
         ]
     optional_arguments = [args.export_path, args.tool_name]
-    
-    if set(optional_arguments) == {None}:
-        # no optional arguments have been passed
-        return required_arguments
-    elif None not in optional_arguments:
-        # all optional arguments have been passed
-        return required_arguments + optional_arguments
+
+    if (set(optional_arguments) == {None} 
+            or None not in optional_arguments):
+        # no or all optional arguments have been passed
+        return required_arguments + optional_arguments + [args]
     else:
         # only some optional arguments have been passed
         print("parseDNAfragments.py: error: only some optional arguments have "
@@ -77,12 +82,55 @@ def parse_arguments():
         sys.exit(2)
         
 
-def process_merged_reads(merged_reads, templates):
+def process_merged_reads(template_ids, merged_reads, template_seqs):
+    """
+    Counts the matching and mismatching bases of the merged reads per
+    phred score. Uses the numba kernel if numba is installed.
+    """
+    if kernels.NUMBA_AVAILABLE:
+        return _process_merged_reads_numba(template_ids, merged_reads, 
+                                           template_seqs)
+    return _process_merged_reads_python(template_ids, merged_reads, 
+                                        template_seqs)
+
+
+def _process_merged_reads_numba(template_ids, merged_reads, template_seqs,
+                                chunk_size=100000):
+    match_cnt = np.zeros(256, dtype=np.int64)
+    mismatch_cnt = np.zeros(256, dtype=np.int64)
+
+    template_ids = template_ids.tolist()
+    for start in range(0, len(merged_reads), chunk_size):
+        orig_seqs, read_seqs, read_qualities = [], [], []
+        for template_id, read in zip(template_ids[start:start+chunk_size], 
+                                     merged_reads[start:start+chunk_size]):
+            orig_seq = template_seqs[template_id]
+            # Make sure that the merged read can be compared with the orig
+            if len(orig_seq) == len(read['sequence']):
+                orig_seqs.append(orig_seq)
+                read_seqs.append(read['sequence'])
+                read_qualities.append(read['quality'])
+        chunk_match_cnt, chunk_mismatch_cnt = kernels.count_matches_by_quality(
+            kernels.as_uint8(read_seqs), 
+            kernels.as_uint8(read_qualities),
+            kernels.as_uint8(orig_seqs))
+        match_cnt += chunk_match_cnt
+        mismatch_cnt += chunk_mismatch_cnt
+
     phred_counter = dict()
+    for qual in np.flatnonzero(match_cnt + mismatch_cnt).tolist():
+        phred_counter[qual-33] = {
+            "match_cnt": int(match_cnt[qual]), 
+            "mismatch_cnt": int(mismatch_cnt[qual])
+            }
+    return phred_counter
 
-    for read in merged_reads:
-        name = read['name']
-        orig_seq = templates[name]['sequence']
+
+def _process_merged_reads_python(template_ids, merged_reads, template_seqs):
+    phred_counter = dict()
+
+    for template_id, read in zip(template_ids.tolist(), merged_reads):
+        orig_seq = template_seqs[template_id]
         read_seq = read['sequence']
         read_quality = read['quality']
         
@@ -114,6 +162,41 @@ def process_merged_reads(merged_reads, templates):
     return phred_counter
 
 
+def evaluate_bucket(join, bucket):
+    """
+    Counts the matching and mismatching bases per phred score for the 
+    merged reads of one bucket of a common.PartitionedJoin, usually in a
+    worker process
+    """
+    template_ids, template_seqs = join.bucket_templates(bucket)
+    phred_counter = dict()
+    for read_ids, merged_reads, _ in join.bucket_reads(bucket, template_ids):
+        add_phred_counts(phred_counter, 
+                         process_merged_reads(read_ids, merged_reads, 
+                                              template_seqs))
+    return phred_counter
+
+
+def evaluate_chunk(chunk, store):
+    """
+    Counts the matching and mismatching bases per phred score for one 
+    chunk of merged reads from common.iter_merged_reads in a worker 
+    process, with the templates in a common.SharedTemplateStore
+    """
+    read_ids, merged_reads, _ = chunk
+    return process_merged_reads(read_ids, merged_reads, store)
+
+
+def add_phred_counts(phred_counter, chunk_counter):
+    """ Adds the counts of chunk_counter to phred_counter """
+    for qual, counts in chunk_counter.items():
+        if qual not in phred_counter:
+            phred_counter[qual] = {"match_cnt": 0, "mismatch_cnt": 0}
+        phred_counter[qual]["match_cnt"] += counts["match_cnt"]
+        phred_counter[qual]["mismatch_cnt"] += counts["mismatch_cnt"]
+    return phred_counter
+
+
 def phred_2_p_error(q_value):
     p_error = 10**(-int(q_value)/10)
     return p_error
@@ -200,35 +283,101 @@ def get_results(phred_counter, alpha):
 
 
 def main(template_path, readm_path, nfrags, fraglen, qualityshift, 
-         export_path=None, tool_name=None):
-
+         export_path=None, tool_name=None, options=None):
+    """
+    options: the checkpoint, memory, jobs, profiling and progress options,
+    see common.add_run_arguments and common.evaluation_options
+    """
+    if options is None:
+        options = common.evaluation_options()
     alpha = 0.01
+    common.set_progress_interval(options.progress_interval)
+    profiler = common.StageProfiler(
+        export_path + ".profile.json" if options.profile else None,
+        export_path + ".prof" if options.cprofile else None)
 
     # Load files --------------------------------------------------------------
 
-    templates = common.load_fasta(template_path)
+    profiler.start("load")
+    # seperator: this character and all charaters to the right of it
+    # will be removed from the fastq header
+    seperator = b'-'
+    join = common.get_partitioned_join(template_path, readm_path, nfrags, 
+                                       seperator, tool_name, 
+                                       ('sequence', 'quality'), 
+                                       options.max_memory, options.jobs)
+    store = None
+    if join is None and options.jobs > 1:
+        # the workers share the templates instead of a copy each, and only
+        # the store holds them
+        template_ids, store = common.SharedTemplateStore.from_fasta(
+            template_path)
+    elif join is None:
+        template_ids, template_seqs = common.load_fasta_ids(template_path)
 
     # Check for duplicate fragments
-    # if len(templates) != nfrags:
-    #     print(f"ATTENTION: number of total_sequences is {len(templates)}, " 
+    # if len(template_ids) != nfrags:
+    #     print(f"ATTENTION: number of total_sequences is {len(template_ids)}, " 
     #           f"but the nfrags is {nfrags}. Possible reason: duplicate "
     #           "fragments")
 
-    reads = common.load_fastq(readm_path)
-    # seperator: this character and all charaters to the right of it
-    # will be removed from the fastq header
-    seperator = b'-'
-    merged_reads = common.clean_merged_reads(reads, templates, seperator)
+    # the phred counts and the position in the merged reads file up to 
+    # which they were counted
+    state = {'offset': 0, 'phred_counter': {}}
+    checkpoint = None
+    if options.checkpoint_path is not None:
+        checkpoint = common.Checkpoint(
+            options.checkpoint_path, [template_path, readm_path, tool_name], 
+            options.checkpoint_interval)
+        saved_state = checkpoint.load() if options.resume else None
+        if saved_state is not None:
+            print(f"resuming at byte {saved_state['offset']} of {readm_path}")
+            state = saved_state
+            # JSON keys are strings
+            state['phred_counter'] = {
+                int(qual): counts 
+                for qual, counts in state['phred_counter'].items()
+                }
 
 
     # Analysis ----------------------------------------------------------------
 
-    phred_counter = process_merged_reads(merged_reads, templates)
+    profiler.start("analysis")
+    # the merged reads are processed in chunks, only one is in memory
+    if join is None:
+        chunks = common.iter_merged_reads(
+            readm_path, template_ids, seperator, tool_name, 
+            fields=('sequence', 'quality'), offset=state['offset'])
+        if store is not None:
+            try:
+                for phred_counter in common.parallel_map(
+                        evaluate_chunk, chunks, (store,), options.jobs):
+                    add_phred_counts(state['phred_counter'], phred_counter)
+            finally:
+                store.close()
+                store.unlink()
+        else:
+            for read_ids, merged_reads, offset in chunks:
+                add_phred_counts(state['phred_counter'], 
+                                 process_merged_reads(read_ids, merged_reads, 
+                                                      template_seqs))
+                state['offset'] = offset
+                if checkpoint is not None:
+                    checkpoint.save(state)
+    else:
+        try:
+            for phred_counter in join.map_buckets(evaluate_bucket, (), 
+                                                  options.jobs):
+                add_phred_counts(state['phred_counter'], phred_counter)
+        finally:
+            join.close()
+    phred_counter = state['phred_counter']
     results = get_results(phred_counter, alpha)
 
 
     # Export results ----------------------------------------------------------
     
+    profiler.start("export")
     if export_path is not None:
 
         df = pd.DataFrame.from_dict(results)
@@ -239,6 +388,10 @@ def main(template_path, readm_path, nfrags, fraglen, qualityshift,
         df.insert(4, 'alpha', alpha)
         df.to_csv(export_path, na_rep="NA")
 
+    if checkpoint is not None:
+        checkpoint.remove()
+    profiler.save()
+
 
 if __name__ == "__main__":
 
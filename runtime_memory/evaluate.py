@@ -1,4 +1,8 @@
+import sys
+import os
 import pandas as pd
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+import benchmarking
 
 filenames = ["AdapterRemoval", 
              "bbmerge", 
@@ -8,9 +12,14 @@ filenames = ["AdapterRemoval",
              "SeqPrep", 
              "seqtk_adna_trim"]
 
-# calculate summary statistics for time (s) and memory (USS) usage
+# calculate summary statistics for time (s) and memory (USS) usage: the
+# median, the MAD and a bootstrap confidence interval of the median, which
+# a single slow repeat does not pull like the mean and the std
 for filename in filenames:
     path = "output/benchmarks/" + filename + ".tsv"
-    df = pd.read_csv(path, sep="\t")
-    df = df[["s", "max_uss"]].describe()
-    df.to_csv("output/evaluation/{}.csv".format(filename))
\ No newline at end of file
+    df = benchmarking.read_benchmark(path)
+    df = pd.DataFrame({
+        column: benchmarking.robust_summary(df[column])
+        for column in ["s", "cpu_time", "max_uss"]
+        })
+    df.to_csv("output/evaluation/{}.csv".format(filename))
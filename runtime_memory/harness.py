@@ -0,0 +1,297 @@
+# Low-noise benchmark of the merging tools. Unlike the repeat() of the
+# snakefile, which runs the repeats of one tool back to back, every round
+# runs all tools once, in a new random order, after warm-up runs that are
+# not measured. So slow periods of the node and the page cache state left
+# by the previous run are spread over all tools instead of biasing one.
+# The tools can be pinned with taskset to a dedicated set of CPUs, by
+# default the CPUs isolated from the scheduler (isolcpus), each tool to
+# as many of them as it has threads. The page cache state of the input
+# reads (warm, cold or as is) is set and recorded before every run. The runs are measured with os.wait4 (wall clock time, CPU
+# time and maximum RSS) and summarized by the median, the MAD and a
+# bootstrap confidence interval of the median.
+
+import sys
+import os
+import argparse
+import ctypes
+import ctypes.util
+import mmap
+import random
+import shutil
+import subprocess
+import tempfile
+import time
+import pandas as pd
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+import benchmarking
+
+
+# columns of the runs that are summarized per tool
+RUN_COLUMNS = ["s", "cpu_time", "max_rss"]
+
+
+def parse_arguments():
+    """Parses the arguments and returns them as a list"""
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-1", "--s1", action="store", type=str, required=True,
+        help="Forward reads, passed to the commands as $S1")
+    parser.add_argument(
+        "-2", "--s2", action="store", type=str, required=True,
+        help="Reverse reads, passed to the commands as $S2")
+    parser.add_argument(
+        "-c", "--commands", action="store", type=str,
+        dest="commands_path",
+        default=os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                             "harness_commands.tsv"),
+        help="Tab-separated file with a tool name, its number of threads "
+        "and a shell command per line (default: harness_commands.tsv next "
+        "to this script)")
+    parser.add_argument(
+        "-o", "--out", action="store", type=str, dest="runs_path",
+        default="output/evaluation/harness_runs.tsv",
+        help="Path to the tsv file with one row per run "
+        "(default: output/evaluation/harness_runs.tsv)")
+    parser.add_argument(
+        "-s", "--summary", action="store", type=str, dest="summary_path",
+        default="output/evaluation/harness_summary.csv",
+        help="Path to the csv file with the summary per tool "
+        "(default: output/evaluation/harness_summary.csv)")
+    parser.add_argument(
+        "-t", "--tools", action="store", type=str, nargs="+",
+        dest="tool_names",
+        help="Only benchmark these tools (default: all in the commands file)")
+    parser.add_argument(
+        "-r", "--repeats", action="store", type=int, default=5,
+        help="Number of measured rounds (default: 5)")
+    parser.add_argument(
+        "-w", "--warmup", action="store", type=int, default=1,
+        help="Number of rounds before the measured ones, which are not "
+        "measured (default: 1)")
+    parser.add_argument(
+        "--cpus", action="store", type=str,
+        help="Pin the tools to these CPUs with taskset, e.g. 2-5 or 2,4,6, "
+        "or 'isolated' for the CPUs isolated with the isolcpus kernel "
+        "parameter. Every tool runs on the first of them, as many as it "
+        "has threads (default: no pinning)")
+    parser.add_argument(
+        "--cache", action="store", choices=["warm", "cold", "asis"],
+        default="warm",
+        help="Page cache state of the input reads before every run: read "
+        "into the cache, evicted from it, or left as is (default: warm)")
+    parser.add_argument(
+        "--seed", action="store", type=int, default=0,
+        help="Seed of the random order of the tools (default: 0)")
+    args = parser.parse_args()
+    return [args.s1, args.s2, args.commands_path, args.runs_path,
+            args.summary_path, args.tool_names, args.repeats, args.warmup,
+            args.cpus, args.cache, args.seed]
+
+
+def load_commands(path, tool_names=None):
+    """
+    Returns the number of threads and the command of the tools from the
+    commands file, as a dict of (threads, command) tuples
+    """
+    commands = {}
+    with open(path) as f:
+        for line in f:
+            if line.startswith("#") or not line.strip():
+                continue
+            tool_name, threads, command = line.rstrip("\n").split("\t", 2)
+            commands[tool_name] = (int(threads), command)
+    if tool_names is not None:
+        missing = set(tool_names) - set(commands)
+        if missing:
+            raise ValueError(f"no command for {', '.join(sorted(missing))} "
+                             f"in {path}")
+        commands = {tool_name: commands[tool_name]
+                    for tool_name in tool_names}
+    return commands
+
+
+# CPUs ------------------------------------------------------------------------
+
+
+ISOLATED_CPUS_PATH = "/sys/devices/system/cpu/isolated"
+
+
+def parse_cpu_list(cpu_list):
+    """Returns the CPUs of a list like 2-5,8 (as in taskset and sysfs)"""
+    cpus = []
+    for part in cpu_list.strip().split(","):
+        if not part:
+            continue
+        first, _, last = part.partition("-")
+        cpus.extend(range(int(first), int(last or first) + 1))
+    return cpus
+
+
+def get_cpus(cpus):
+    """
+    Returns the CPUs for the tools from the --cpus argument, a list or 
+    'isolated', or None if the tools are not pinned
+    """
+    if cpus is None:
+        return None
+    if cpus != "isolated":
+        return parse_cpu_list(cpus)
+    try:
+        with open(ISOLATED_CPUS_PATH) as f:
+            isolated = parse_cpu_list(f.read())
+    except OSError:
+        isolated = []
+    if not isolated:
+        print("WARNING: no CPUs are isolated (isolcpus kernel parameter), "
+              "the tools are not pinned", file=sys.stderr)
+        return None
+    return isolated
+
+
+def pin_cpus(cpus, threads, tool_name):
+    """Returns the first CPUs for a tool with threads threads, for taskset"""
+    if cpus is None:
+        return None
+    if threads > len(cpus):
+        raise ValueError(f"{tool_name} has {threads} threads, but only "
+                         f"{len(cpus)} CPUs are given with --cpus")
+    return ",".join(str(cpu) for cpu in cpus[:threads])
+
+
+# Page cache ------------------------------------------------------------------
+
+
+_libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+_libc.mmap.restype = ctypes.c_void_p
+_libc.mmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_int,
+                       ctypes.c_int, ctypes.c_int, ctypes.c_long]
+_libc.munmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t]
+_libc.mincore.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_void_p]
+
+
+def cached_fraction(path):
+    """Returns the fraction of the pages of a file in the page cache"""
+    size = os.path.getsize(path)
+    if size == 0:
+        return 1.0
+    npages = (size + mmap.PAGESIZE - 1) // mmap.PAGESIZE
+    vec = (ctypes.c_ubyte * npages)()
+    with open(path, 'rb') as f:
+        # mapping a file does not read it, mincore then tells which of its
+        # pages are in the page cache
+        address = _libc.mmap(None, size, mmap.PROT_READ, mmap.MAP_SHARED,
+                             f.fileno(), 0)
+        if address == ctypes.c_void_p(-1).value:
+            raise OSError(ctypes.get_errno(), f"mmap of {path} failed")
+        try:
+            if _libc.mincore(address, size, vec) != 0:
+                raise OSError(ctypes.get_errno(), f"mincore of {path} failed")
+        finally:
+            _libc.munmap(address, size)
+    return sum(byte & 1 for byte in vec) / npages
+
+
+def set_cache_state(paths, state):
+    """Reads the files into the page cache or evicts them from it"""
+    for path in paths:
+        if state == "warm":
+            with open(path, 'rb') as f:
+                while f.read(2**24):
+                    pass
+        elif state == "cold":
+            with open(path, 'rb') as f:
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+
+
+# Runs ------------------------------------------------------------------------
+
+
+def run_command(command, env, cpus=None, log_path=os.devnull):
+    """
+    Runs a shell command and returns its exit code, the wall clock time,
+    the CPU time (user + system) of it and its children and the maximum
+    RSS (in MB) of the largest of its processes
+    """
+    args = ["sh", "-c", command]
+    if cpus is not None:
+        args = ["taskset", "-c", cpus] + args
+    with open(log_path, 'wb') as log:
+        start = time.monotonic()
+        process = subprocess.Popen(args, env=env, stdout=log,
+                                   stderr=subprocess.STDOUT)
+        _, status, rusage = os.wait4(process.pid, 0)
+        wall = time.monotonic() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return (process.returncode, wall, rusage.ru_utime + rusage.ru_stime,
+            rusage.ru_maxrss / 1024)
+
+
+def main(s1, s2, commands_path, runs_path, summary_path, tool_names=None,
+         repeats=5, warmup=1, cpus=None, cache="warm", seed=0):
+
+    commands = load_commands(commands_path, tool_names)
+    cpus = get_cpus(cpus)
+    tool_cpus = {tool_name: pin_cpus(cpus, threads, tool_name)
+                 for tool_name, (threads, _) in commands.items()}
+    rng = random.Random(seed)
+    tmpdir = tempfile.mkdtemp(prefix="harness_")
+    env = dict(os.environ, S1=os.path.abspath(s1), S2=os.path.abspath(s2))
+
+    runs = []
+    try:
+        for round_ in range(-warmup, repeats):
+            order = list(commands)
+            rng.shuffle(order)
+            for position, tool_name in enumerate(order):
+                outdir = os.path.join(tmpdir, tool_name)
+                shutil.rmtree(outdir, ignore_errors=True)
+                os.makedirs(outdir)
+                set_cache_state([s1, s2], cache)
+                cached = min(cached_fraction(s1), cached_fraction(s2))
+                returncode, wall, cpu_time, max_rss = run_command(
+                    commands[tool_name][1], dict(env, OUTDIR=outdir), 
+                    tool_cpus[tool_name],
+                    os.path.join(tmpdir, f"{tool_name}.log"))
+                if returncode != 0:
+                    with open(os.path.join(tmpdir, f"{tool_name}.log")) as f:
+                        print(f.read(), file=sys.stderr)
+                    raise RuntimeError(f"{tool_name} failed with exit code "
+                                       f"{returncode}")
+                print(f"round {round_}: {tool_name} {wall:.2f} s")
+                runs.append({
+                    "program": tool_name,
+                    "round": round_,
+                    "position": position,
+                    "warmup": round_ < 0,
+                    "cached_fraction": cached,
+                    "cpus": tool_cpus[tool_name],
+                    "s": wall,
+                    "cpu_time": cpu_time,
+                    "max_rss": max_rss,
+                    })
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+    runs = pd.DataFrame(runs)
+    runs.to_csv(runs_path, sep="\t", index=False)
+
+    # summary of the measured runs
+    summary = []
+    measured = runs[~runs["warmup"]]
+    for tool_name, df in measured.groupby("program", sort=False):
+        row = {"program": tool_name, "cache": cache}
+        for column in RUN_COLUMNS:
+            for statistic, value in benchmarking.robust_summary(
+                    df[column]).items():
+                row[f"{column}_{statistic}"] = value
+        summary.append(row)
+    summary = pd.DataFrame(summary)
+    summary.to_csv(summary_path, index=False)
+    print(summary[["program", "s_median", "s_mad", "s_ci_lower",
+                   "s_ci_upper", "max_rss_median"]].to_string(index=False))
+
+
+if __name__ == "__main__":
+
+    args = parse_arguments()
+    main(*args)
@@ -0,0 +1,127 @@
+# Summarizes the input size scaling benchmark of the snakefile: every tool
+# is run on datasets with 10^4 to 10^8 fragments. Reports the read pairs
+# per second and the maximum USS per tool and number of fragments, and
+# fits the time and the memory against the number of fragments with a
+# power law (a line in log-log space). An exponent of about 1 means that
+# the time (or memory) grows linearly with the input, about 0 that it is
+# constant.
+
+import sys
+import os
+import re
+import glob
+import argparse
+import numpy as np
+import pandas as pd
+import scipy.stats as st
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+import benchmarking
+
+
+TOOLNAMES = [
+    "leeHom", "AdapterRemoval", "ClipAndMerge", "seqtk_adna_trim",
+    "bbmerge", "fastp", "SeqPrep"
+    ]
+
+
+def parse_arguments():
+    """Parses the arguments and returns them as a list"""
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-i", "--benchmarks", action="store", type=str,
+        dest="benchmark_dir", default="output/benchmarks",
+        help="Directory with the benchmark files, which are in "
+        "nfrags/{tool}/n{nfrags}.tsv (default: output/benchmarks)")
+    parser.add_argument(
+        "-o", "--out", action="store", type=str, dest="export_path",
+        default="output/evaluation/size_scaling.csv",
+        help="Path to the output csv file with one row per tool and number "
+        "of fragments (default: output/evaluation/size_scaling.csv)")
+    parser.add_argument(
+        "-f", "--fits", action="store", type=str, dest="fits_path",
+        default="output/evaluation/size_scaling_fits.csv",
+        help="Path to the output csv file with the fits, one row per tool "
+        "(default: output/evaluation/size_scaling_fits.csv)")
+    args = parser.parse_args()
+    return [args.benchmark_dir, args.export_path, args.fits_path]
+
+
+def load_size_benchmarks(benchmark_dir, tool_name):
+    """
+    Returns the summaries of the input size benchmarks of one tool, one
+    per number of fragments
+    """
+    rows = []
+    pattern = os.path.join(benchmark_dir, "nfrags", tool_name, "n*.tsv")
+    for path in glob.glob(pattern):
+        match = re.fullmatch(r"n(\d+)\.tsv", os.path.basename(path))
+        if match is None:
+            continue
+        nfrags = int(match.group(1))
+        summary = benchmarking.summarize_benchmark(
+            benchmarking.read_benchmark(path))
+        rows.append({"program": tool_name, "nfrags": nfrags, **summary})
+    return sorted(rows, key=lambda row: row["nfrags"])
+
+
+def fit_power_law(x, y):
+    """
+    Fits y = a * x^b by linear regression of log10(y) on log10(x).
+    Returns the exponent b, its standard error, the factor a and R^2.
+    Points with y <= 0 are left out.
+    """
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    keep = (x > 0) & (y > 0)
+    if keep.sum() < 2:
+        return np.nan, np.nan, np.nan, np.nan
+    fit = st.linregress(np.log10(x[keep]), np.log10(y[keep]))
+    return fit.slope, fit.stderr, 10**fit.intercept, fit.rvalue**2
+
+
+def fit_tool(df):
+    """Returns the fits of the time and the memory of one tool"""
+    fits = {"program": df["program"].iloc[0], "points": len(df)}
+    for column, name in [("s", "time"), ("cpu_time", "cpu_time"),
+                         ("max_uss", "memory")]:
+        exponent, stderr, factor, r2 = fit_power_law(df["nfrags"],
+                                                     df[column])
+        fits[f"{name}_exponent"] = exponent
+        fits[f"{name}_exponent_stderr"] = stderr
+        fits[f"{name}_factor"] = factor
+        fits[f"{name}_r2"] = r2
+    return fits
+
+
+def main(benchmark_dir, export_path, fits_path):
+
+    results, fits = [], []
+    for tool_name in TOOLNAMES:
+        rows = load_size_benchmarks(benchmark_dir, tool_name)
+        if not rows:
+            print(f"no benchmarks for {tool_name}")
+            continue
+        df = pd.DataFrame(rows)
+        # one read pair per fragment
+        df["reads_per_s"] = df["nfrags"] / df["s"]
+        results.append(df)
+        fits.append(fit_tool(df))
+    if not results:
+        sys.exit(f"error: no size benchmarks of any tool in "
+                 f"{os.path.join(benchmark_dir, 'nfrags')}")
+    df = pd.concat(results, ignore_index=True)
+    columns = ["program", "nfrags", "repeats", "s", "cpu_time", "max_uss",
+               "reads_per_s"]
+    df = df[columns]
+    df.to_csv(export_path, index=False)
+    fits = pd.DataFrame(fits)
+    fits.to_csv(fits_path, index=False)
+    print(df.to_string(index=False))
+    print()
+    print(fits[["program", "points", "time_exponent", "time_r2",
+                "memory_exponent", "memory_r2"]].to_string(index=False))
+
+
+if __name__ == "__main__":
+
+    args = parse_arguments()
+    main(*args)
@@ -0,0 +1,102 @@
+# Summarizes the thread scaling benchmark of the snakefile: every tool
+# with a parameter for the number of threads is benchmarked with 1, 2, 4,
+# 8 and 16 threads on the Vi33.19 dataset. Reports the wall clock time,
+# the CPU time and the maximum USS (medians of the repeats), the speedup
+# over 1 thread and the parallel efficiency (speedup / threads).
+
+import sys
+import os
+import argparse
+import pandas as pd
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+import benchmarking
+
+
+TOOLNAMES = [
+    "leeHom", "AdapterRemoval", "ClipAndMerge", "seqtk_adna_trim",
+    "bbmerge", "fastp", "SeqPrep"
+    ]
+THREADS = [1, 2, 4, 8, 16]
+
+
+def parse_arguments():
+    """Parses the arguments and returns them as a list"""
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-i", "--benchmarks", action="store", type=str,
+        dest="benchmark_dir", default="output/benchmarks",
+        help="Directory with the benchmark files. The thread scaling "
+        "benchmarks are in threads/{tool}/t{threads}.tsv, tools without "
+        "them are reported with the 1 thread benchmark {tool}.tsv "
+        "(default: output/benchmarks)")
+    parser.add_argument(
+        "-o", "--out", action="store", type=str, dest="export_path",
+        default="output/evaluation/thread_scaling.csv",
+        help="Path to the output csv file "
+        "(default: output/evaluation/thread_scaling.csv)")
+    args = parser.parse_args()
+    return [args.benchmark_dir, args.export_path]
+
+
+def load_thread_benchmarks(benchmark_dir, tool_name):
+    """
+    Returns the summaries of the thread scaling benchmarks of one tool,
+    one per number of threads
+    """
+    rows = []
+    for threads in THREADS:
+        path = benchmarking.benchmark_path(benchmark_dir, "threads",
+                                           tool_name, f"t{threads}.tsv")
+        if path is None:
+            continue
+        summary = benchmarking.summarize_benchmark(
+            benchmarking.read_benchmark(path))
+        rows.append({"program": tool_name, "threads": threads, **summary})
+    if not rows:
+        # no parameter for the number of threads
+        path = benchmarking.benchmark_path(benchmark_dir, f"{tool_name}.tsv")
+        if path is not None:
+            summary = benchmarking.summarize_benchmark(
+                benchmarking.read_benchmark(path))
+            rows.append({"program": tool_name, "threads": 1, **summary})
+    return rows
+
+
+def add_scaling(df):
+    """
+    Adds the speedup over the run with 1 thread and the parallel
+    efficiency to the summaries of one tool
+    """
+    single = df.loc[df["threads"] == 1, "s"]
+    if single.empty:
+        df["speedup"] = float("nan")
+    else:
+        df["speedup"] = single.iloc[0] / df["s"]
+    df["efficiency"] = df["speedup"] / df["threads"]
+    return df
+
+
+def main(benchmark_dir, export_path):
+
+    results = []
+    for tool_name in TOOLNAMES:
+        rows = load_thread_benchmarks(benchmark_dir, tool_name)
+        if not rows:
+            print(f"no benchmarks for {tool_name}")
+            continue
+        results.append(add_scaling(pd.DataFrame(rows)))
+    if not results:
+        sys.exit(f"error: no thread benchmarks of any tool in "
+                 f"{os.path.join(benchmark_dir, 'threads')}")
+    df = pd.concat(results, ignore_index=True)
+    columns = ["program", "threads", "repeats", "s", "cpu_time", "max_uss",
+               "speedup", "efficiency"]
+    df = df[columns]
+    print(df.to_string(index=False))
+    df.to_csv(export_path, index=False)
+
+
+if __name__ == "__main__":
+
+    args = parse_arguments()
+    main(*args)
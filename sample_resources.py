@@ -0,0 +1,240 @@
+#!/usr/bin/python3
+
+"""
+Runs a command (e.g. one of the merging tools) and samples the resource
+usage of its whole process tree from /proc at a fixed interval: the RSS
+and the read and written bytes of every process and the CPU usage of
+every thread. The samples are written as a gzipped tsv file, one row per
+thread and sample, so that warm-up phases, memory growth and io stalls
+are visible, which the one-line summaries of the snakemake benchmark
+directive hide. Linux only, and only uses the standard library.
+
+Example, in the shell command of a snakemake rule:
+    python3 sample_resources.py -o {log} -- java -jar {CLIPMERGE} ...
+A single command string is run by the shell, so pipes work:
+    python3 sample_resources.py -o {log} -- "seqtk mergepe a b | gzip > c"
+"""
+
+
+import argparse
+import gzip
+import os
+import shlex
+import subprocess
+import sys
+import time
+
+
+CLK_TCK = os.sysconf("SC_CLK_TCK")
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+COLUMNS = [
+    "time", "pid", "tid", "name", "cpu_percent", "rss_kb", "read_bytes",
+    "write_bytes"
+    ]
+
+
+def parse_arguments():
+    """
+    """
+    parser = argparse.ArgumentParser(
+        description="Runs a command and samples the RSS, the CPU usage per "
+                    "thread and the io of its process tree from /proc.")
+
+    # required arguments
+    parser.add_argument(
+        "-o", "--out", action="store", type=str, required=True,
+        dest="export_path", help="Path of the gzipped tsv file with the "
+                                 "samples")
+    parser.add_argument(
+        "command", nargs="+", help="Command to run (after --). A single "
+                                   "argument is run by the shell.")
+
+    # optional arguments
+    parser.add_argument(
+        "-i", "--interval", action="store", type=float, default=0.5,
+        help="Seconds between two samples (default: 0.5)")
+
+    args = parser.parse_args()
+    arguments = [
+        args.command,
+        args.export_path,
+        args.interval,
+        ]
+    return arguments
+
+
+def _read(path):
+    """ Returns the content of a file in /proc, or None if it is gone """
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except (FileNotFoundError, ProcessLookupError, PermissionError):
+        return None
+
+
+def _parse_stat(data):
+    """
+    Parses a /proc/<pid>/stat or /proc/<pid>/task/<tid>/stat line. The
+    name is in parentheses and can contain spaces, so the other fields
+    are split after the last parenthesis. Returns the name, the parent
+    PID, the CPU ticks (user + system), the start time in ticks since
+    boot and the RSS in pages.
+    """
+    start, end = data.index(b'('), data.rindex(b')')
+    name = data[start+1:end].decode(errors='replace')
+    # fields from the third on, the first two are pid and name
+    fields = data[end+2:].split()
+    ppid = int(fields[1])
+    ticks = int(fields[11]) + int(fields[12])
+    starttime = int(fields[19])
+    rss_pages = int(fields[21])
+    return name, ppid, ticks, starttime, rss_pages
+
+
+def _parse_io(data):
+    """ Returns the read and written bytes from /proc/<pid>/io """
+    if data is None:
+        return None, None
+    values = dict(line.split(b': ') for line in data.splitlines())
+    return int(values[b'read_bytes']), int(values[b'write_bytes'])
+
+
+def get_process_tree(root_pid):
+    """ Returns the PIDs of a process and all its descendants """
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        data = _read(f"/proc/{entry}/stat")
+        if data is None:
+            continue
+        ppid = _parse_stat(data)[1]
+        children.setdefault(ppid, []).append(int(entry))
+    tree, stack = [], [root_pid]
+    while stack:
+        pid = stack.pop()
+        tree.append(pid)
+        stack.extend(children.get(pid, []))
+    return tree
+
+
+def uptime():
+    """ Seconds since boot, the clock of the start times in /proc """
+    return float(_read("/proc/uptime").split()[0])
+
+
+class ResourceSampler:
+    """
+    Samples a process tree and keeps the CPU ticks of every thread from
+    the previous sample, to calculate the CPU usage in between
+    """
+
+    def __init__(self, root_pid):
+        self.root_pid = root_pid
+        self.prev_ticks = {}
+        self.prev_time = None
+        self.start_time = uptime()
+        # peaks over the whole run, for the summary
+        self.max_rss_kb = 0
+        self.cpu_ticks = {}
+        self.io_bytes = {}
+
+    def sample(self):
+        """ Returns one row (a list of values) per thread in the tree """
+        now = uptime()
+        rows = []
+        total_rss_kb = 0
+        for pid in get_process_tree(self.root_pid):
+            data = _read(f"/proc/{pid}/stat")
+            if data is None:
+                continue
+            rss_kb = _parse_stat(data)[4] * PAGE_SIZE // 1024
+            total_rss_kb += rss_kb
+            read_bytes, write_bytes = _parse_io(_read(f"/proc/{pid}/io"))
+            if read_bytes is not None:
+                self.io_bytes[pid] = (read_bytes, write_bytes)
+            try:
+                tids = os.listdir(f"/proc/{pid}/task")
+            except FileNotFoundError:
+                continue
+            for tid in map(int, tids):
+                data = _read(f"/proc/{pid}/task/{tid}/stat")
+                if data is None:
+                    continue
+                name, _, ticks, starttime, _ = _parse_stat(data)
+                # the CPU usage since the previous sample, or since the
+                # start of the thread if it is new
+                since = starttime / CLK_TCK
+                if self.prev_time is not None:
+                    since = max(since, self.prev_time)
+                prev_ticks = self.prev_ticks.get((pid, tid), 0)
+                elapsed = now - since
+                cpu_percent = 0.0
+                if elapsed > 0:
+                    cpu_percent = ((ticks - prev_ticks) / CLK_TCK
+                                   / elapsed * 100)
+                self.prev_ticks[(pid, tid)] = ticks
+                self.cpu_ticks[(pid, tid)] = ticks
+                rows.append([
+                    round(now - self.start_time, 3), pid, tid, name,
+                    round(cpu_percent, 1), rss_kb, read_bytes, write_bytes
+                    ])
+        self.prev_time = now
+        self.max_rss_kb = max(self.max_rss_kb, total_rss_kb)
+        return rows
+
+    def summary(self):
+        """ Returns the peaks and totals of the sampled values """
+        return {
+            "max_rss_kb": self.max_rss_kb,
+            "cpu_s": round(sum(self.cpu_ticks.values()) / CLK_TCK, 2),
+            "read_bytes": sum(io[0] for io in self.io_bytes.values()),
+            "write_bytes": sum(io[1] for io in self.io_bytes.values()),
+            "threads": len(self.cpu_ticks),
+            }
+
+
+def _format_row(row):
+    return "\t".join("" if value is None else str(value)
+                     for value in row) + "\n"
+
+
+def main(command, export_path, interval=0.5):
+
+    shell = len(command) == 1
+    process = subprocess.Popen(command[0] if shell else command, shell=shell)
+    sampler = ResourceSampler(process.pid)
+    start = time.monotonic()
+
+    with gzip.open(export_path, 'wt') as f:
+        command_string = command[0] if shell else shlex.join(command)
+        f.write("# command: " + command_string.replace("\n", "\\n") + "\n")
+        f.write(f"# interval: {interval}\n")
+        f.write("\t".join(COLUMNS) + "\n")
+        while True:
+            # the process is reaped only after it was sampled one last
+            # time, so that its threads are still in /proc
+            for row in sampler.sample():
+                f.write(_format_row(row))
+            pid, status, rusage = os.wait4(process.pid, os.WNOHANG)
+            if pid != 0:
+                break
+            time.sleep(interval)
+    process.returncode = os.waitstatus_to_exitcode(status)
+
+    # the sampled values miss what happened between the last sample and
+    # the exit, the rusage of the children does not
+    summary = sampler.summary()
+    summary["wall_s"] = round(time.monotonic() - start, 2)
+    summary["rusage_max_rss_kb"] = rusage.ru_maxrss
+    summary["rusage_cpu_s"] = round(rusage.ru_utime + rusage.ru_stime, 2)
+    print(" ".join(f"{key}={value}" for key, value in summary.items()),
+          file=sys.stderr)
+    return process.returncode
+
+
+if __name__ == "__main__":
+
+    args = parse_arguments()
+    sys.exit(main(*args))
@@ -0,0 +1,19 @@
+# The scripts import the modules in the root of the repository, like the
+# scripts in the subfolders do, and load the scripts in the subfolders
+# with load_script
+
+import importlib.util
+import os
+import sys
+
+BASEDIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, BASEDIR)
+
+
+def load_script(path):
+    """ Imports one of the python scripts in the subfolders """
+    spec = importlib.util.spec_from_file_location(
+        os.path.basename(os.path.dirname(path)).replace("-", "_"), path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
@@ -0,0 +1,68 @@
+# The edit distances of the myers kernel against edlib, with and without
+# a maximum edit distance and the alignment cache
+
+import numpy as np
+import pytest
+import alignment
+
+
+def _random_pairs(rng, n, min_len=0, max_len=200):
+    """ Templates of random lengths and reads with up to 20 edits """
+    template_seqs, read_seqs = [], []
+    for _ in range(n):
+        template = bytearray(rng.choice(list(b'ACGT'), 
+                                        rng.integers(min_len, max_len + 1)))
+        read = bytearray(template)
+        for _ in range(rng.integers(0, 21)):
+            operation = rng.integers(3)
+            i = int(rng.integers(0, len(read) + 1))
+            if operation == 0:
+                read.insert(i, int(rng.choice(list(b'ACGTN'))))
+            elif read and operation == 1:
+                del read[min(i, len(read) - 1)]
+            elif read:
+                read[min(i, len(read) - 1)] = int(rng.choice(list(b'ACGTN')))
+        template_seqs.append(bytes(template))
+        read_seqs.append(bytes(read))
+    return template_seqs, read_seqs
+
+
+@pytest.fixture(scope="module")
+def pairs():
+    template_seqs, read_seqs = _random_pairs(np.random.default_rng(0), 1000)
+    # empty and long (several 64-bit words) sequences
+    template_seqs += [b'', b'', b'ACGT', b'A' * 300, b'ACGT' * 100]
+    read_seqs += [b'', b'ACGTACGT', b'', b'A' * 290, b'ACGA' * 99]
+    return template_seqs, read_seqs
+
+
+def test_myers_edlib(pairs):
+    template_seqs, read_seqs = pairs
+    expected = alignment.edlib_edit_distances(template_seqs, read_seqs)
+    edit_distances = alignment.myers_edit_distances(template_seqs, read_seqs,
+                                                    batch_size=64)
+    assert np.array_equal(edit_distances, expected)
+
+
+@pytest.mark.parametrize("aligner", sorted(alignment.ALIGNERS))
+@pytest.mark.parametrize("k", [0, 3, 10])
+def test_max_edit_distance(pairs, aligner, k):
+    template_seqs, read_seqs = pairs
+    expected = alignment.edlib_edit_distances(template_seqs, read_seqs)
+    expected = np.minimum(expected, k + 1)
+    edit_distances = alignment.get_edit_distances(template_seqs, read_seqs, 
+                                                  aligner=aligner, k=k)
+    assert np.array_equal(edit_distances, expected)
+
+
+@pytest.mark.parametrize("k", [None, 5])
+def test_alignment_cache(pairs, tmp_path, k):
+    template_seqs, read_seqs = pairs
+    expected = alignment.get_edit_distances(template_seqs, read_seqs, k=k)
+    cache = alignment.AlignmentCache(str(tmp_path / "cache.db"), 500)
+    for _ in range(2):
+        edit_distances = alignment.get_edit_distances(
+            template_seqs, read_seqs, cache, k=k)
+        assert np.array_equal(edit_distances, expected)
+    assert cache.hits > 0
+    cache.close()
@@ -0,0 +1,190 @@
+# The evaluation scripts: the partitioned join against the evaluation 
+# in memory, also with duplicate template names, and resuming from a
+# checkpoint, and the comparison of the tools independent of the read
+# order
+
+import itertools
+import os
+import sys
+import numpy as np
+import pytest
+import common
+import estimation
+from conftest import BASEDIR, load_script
+
+sys.path.insert(0, os.path.join(BASEDIR, "benchmarks"))
+import synthetic
+
+
+NTEMPLATES = 3000
+NDUPLICATES = 30
+TOOL_NAME = "AdapterRemoval"
+
+
+@pytest.fixture(scope="module")
+def dataset(tmp_path_factory):
+    """
+    Templates with some duplicate names (with another sequence, later in
+    the file) and the merged reads of the unique templates
+    """
+    directory = tmp_path_factory.mktemp("dataset")
+    names, templates = synthetic.make_templates(NTEMPLATES, seed=1)
+    rng = np.random.default_rng(2)
+    names_dup, templates_dup = list(names), list(templates)
+    for i in sorted(rng.choice(NTEMPLATES, NDUPLICATES, 
+                               replace=False).tolist()):
+        position = int(rng.integers(i + 1, len(names_dup) + 1))
+        names_dup.insert(position, names[i])
+        templates_dup.insert(position, templates[i][::-1])
+    template_path = str(directory / "templates.fa")
+    readm_path = str(directory / "merged.fq.gz")
+    synthetic.write_fasta(template_path, names_dup, templates_dup)
+    synthetic.write_fastq(readm_path, synthetic.make_merged_reads(
+        names, templates, TOOL_NAME, seed=3))
+    return template_path, readm_path, len(names_dup)
+
+
+@pytest.fixture(scope="module")
+def lengths():
+    return load_script(os.path.join(
+        BASEDIR, "merging_accuracy_lengths", "evaluate.py"))
+
+
+@pytest.fixture(scope="module")
+def phred():
+    return load_script(os.path.join(BASEDIR, "phred_accuracy", 
+                                    "evaluate.py"))
+
+
+@pytest.fixture
+def partitioned(monkeypatch):
+    """ Makes --max-memory 1 partition the templates into 8 buckets """
+    monkeypatch.setattr(common, "estimate_template_memory", 
+                        lambda path, ntemplates: 4 * 2**20)
+
+
+def _run_lengths(lengths, dataset, out_prefix, **options):
+    template_path, readm_path, nfrags = dataset
+    export_path = f"{out_prefix}.csv"
+    lengths.main(template_path, readm_path, nfrags, 100, export_path, 
+                 TOOL_NAME, common.evaluation_options(**options))
+    with open(export_path) as f:
+        csv = f.read()
+    arrays = None
+    if options.get("arrays_prefix") is not None:
+        arrays = common.load_template_arrays(options["arrays_prefix"])
+    return csv, arrays
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_partitioned_lengths(lengths, dataset, partitioned, tmp_path, jobs):
+    expected_csv, expected_arrays = _run_lengths(
+        lengths, dataset, tmp_path / "memory", nbootstrap=20,
+        arrays_prefix=str(tmp_path / "memory"))
+    csv, arrays = _run_lengths(
+        lengths, dataset, tmp_path / "partitioned", nbootstrap=20, 
+        arrays_prefix=str(tmp_path / "partitioned"), max_memory=1, 
+        jobs=jobs)
+    assert csv == expected_csv
+    for name in common.TEMPLATE_ARRAYS:
+        assert np.array_equal(arrays[name], expected_arrays[name])
+    # the arrays are indexed by the IDs of load_fasta_ids
+    template_ids, _ = common.load_fasta_ids(dataset[0])
+    assert len(template_ids) == NTEMPLATES
+    assert len(arrays["merged"]) == NTEMPLATES
+
+
+def test_partitioned_phred(phred, dataset, partitioned, tmp_path):
+    template_path, readm_path, nfrags = dataset
+    for name, options in [("memory", {}), ("partitioned", {'max_memory': 1})]:
+        phred.main(template_path, readm_path, nfrags, 100, 0, 
+                   str(tmp_path / f"{name}.csv"), TOOL_NAME, 
+                   common.evaluation_options(**options))
+    with open(tmp_path / "memory.csv") as f, \
+            open(tmp_path / "partitioned.csv") as g:
+        assert f.read() == g.read()
+
+
+def test_shared_store_from_fasta(lengths, dataset, tmp_path):
+    template_ids, template_seqs = common.load_fasta_ids(dataset[0])
+    store_ids, store = common.SharedTemplateStore.from_fasta(dataset[0])
+    try:
+        assert store_ids == template_ids
+        assert [store[i] for i in range(len(store))] == template_seqs
+    finally:
+        store.close()
+        store.unlink()
+    # the workers of the parallel evaluation get the templates of the store
+    expected_csv, expected_arrays = _run_lengths(
+        lengths, dataset, tmp_path / "memory", 
+        arrays_prefix=str(tmp_path / "memory"))
+    csv, arrays = _run_lengths(
+        lengths, dataset, tmp_path / "parallel", 
+        arrays_prefix=str(tmp_path / "parallel"), jobs=2)
+    assert csv == expected_csv
+    for name in common.TEMPLATE_ARRAYS:
+        assert np.array_equal(arrays[name], expected_arrays[name])
+
+
+def test_checkpoint_resume(lengths, dataset, tmp_path, capsys):
+    template_path, readm_path, nfrags = dataset
+    expected_csv, _ = _run_lengths(lengths, dataset, tmp_path / "full", 
+                                   nbootstrap=20)
+
+    # a checkpoint of an evaluation that was killed after 2 chunks
+    checkpoint_path = str(tmp_path / "checkpoint.json")
+    options = common.evaluation_options(nbootstrap=20)
+    inputs = [template_path, readm_path, TOOL_NAME, nfrags, options.aligner,
+              options.max_edit_dist, options.nbootstrap]
+    checkpoint = common.Checkpoint(checkpoint_path, inputs, interval=0)
+    template_ids, template_seqs = common.load_fasta_ids(template_path)
+    chunks = common.iter_merged_reads(readm_path, template_ids, b'-', 
+                                      TOOL_NAME, chunk_size=500, offset=0)
+    state = {'offset': 0, 'edit_dist_counts': np.zeros(0, dtype=np.int64)}
+    bootstrap = estimation.PoissonBootstrap(len(template_ids), 20)
+    common.evaluate_merged_reads(itertools.islice(chunks, 2), template_seqs,
+                                 state, bootstrap=bootstrap, 
+                                 checkpoint=checkpoint)
+    assert checkpoint.load()['offset'] > 0
+
+    csv, _ = _run_lengths(lengths, dataset, tmp_path / "resumed", 
+                          nbootstrap=20, checkpoint_path=checkpoint_path, 
+                          resume=True)
+    assert "resuming at byte" in capsys.readouterr().out
+    assert csv == expected_csv
+    assert not os.path.exists(checkpoint_path)
+
+
+@pytest.fixture(scope="module")
+def compare_tools():
+    return load_script(os.path.join(
+        BASEDIR, "merging_accuracy_distributions", "compare_tools.py"))
+
+
+def test_compare_tools_order(compare_tools, dataset, tmp_path):
+    template_path = dataset[0]
+    names, templates = synthetic.make_templates(NTEMPLATES, seed=1)
+    tool_names = ["AdapterRemoval", "leeHom"]
+    reads = [synthetic.make_merged_reads(names, templates, tool_name, 
+                                         seed=seed, unmerged_fraction=0)
+             for seed, tool_name in enumerate(tool_names)]
+    # the reads of the second tool shuffled, with a read of no template
+    shuffled = [reads[0], list(reads[1])]
+    np.random.default_rng(4).shuffle(shuffled[1])
+    shuffled[1].insert(10, (b"@chr0:0-0-1", b"ACGT", b"IIII"))
+    outputs = []
+    for name, tool_reads in [("ordered", reads), ("shuffled", shuffled)]:
+        read_paths = []
+        for tool_name, fastq in zip(tool_names, tool_reads):
+            read_paths.append(str(tmp_path / f"{name}_{tool_name}.fq"))
+            synthetic.write_fastq(read_paths[-1], fastq)
+        out_prefix = str(tmp_path / name)
+        compare_tools.main(template_path, read_paths, tool_names, 
+                           out_prefix, b'-', nbuckets=3)
+        with open(out_prefix + "_disagreement.csv") as f:
+            outputs.append((np.load(out_prefix + "_masks.npy"), f.read()))
+    assert np.array_equal(outputs[0][0], outputs[1][0])
+    assert outputs[0][1] == outputs[1][1]
+    # every template that the first tool merged has its bit set
+    assert len(outputs[0][0]) == NTEMPLATES
+    assert np.count_nonzero(outputs[0][0][:, 0] & 1) == len(reads[0])
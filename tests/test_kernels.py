@@ -0,0 +1,95 @@
+# The numba kernels (or their plain python stand-ins if numba is not 
+# installed) against the pure python loops of the scripts
+
+import os
+import numpy as np
+import pytest
+from conftest import BASEDIR, load_script
+
+
+QUALITIES = bytes(range(33, 33 + 42))
+
+
+def _random_seqs(rng, n, min_len, max_len, alphabet=b'ACGT'):
+    alphabet = np.frombuffer(alphabet, dtype=np.uint8)
+    return [
+        rng.choice(alphabet, rng.integers(min_len, max_len + 1)).tobytes()
+        for _ in range(n)
+        ]
+
+
+def _random_reads(rng, template_seqs):
+    """ Merged reads with a few errors, some of them one base too short """
+    reads = []
+    for template_seq in template_seqs:
+        read_seq = bytearray(template_seq)
+        for i in rng.integers(0, len(read_seq), 3):
+            read_seq[i] = b'ACGTN'[rng.integers(5)]
+        if rng.random() < 0.1:
+            read_seq = read_seq[1:]
+        reads.append({
+            'sequence': bytes(read_seq),
+            'quality': _random_seqs(rng, 1, len(read_seq), len(read_seq),
+                                    QUALITIES)[0],
+            })
+    return reads
+
+
+def _write_fastq(path, reads):
+    with open(path, 'wb') as f:
+        for i, read in enumerate(reads):
+            f.write(b"@r%d\n%s\n+\n%s\n" % (i, read['sequence'], 
+                                            read['quality']))
+
+
+@pytest.fixture(scope="module")
+def phred():
+    return load_script(os.path.join(BASEDIR, "phred_accuracy", 
+                                    "evaluate.py"))
+
+
+@pytest.fixture(scope="module")
+def count():
+    return load_script(os.path.join(BASEDIR, "phred_accuracy", 
+                                    "count_simulated_reads.py"))
+
+
+def test_process_merged_reads(phred):
+    rng = np.random.default_rng(0)
+    template_seqs = _random_seqs(rng, 2000, 2, 150)
+    reads = _random_reads(rng, template_seqs)
+    template_ids = np.arange(len(reads))
+    assert (phred._process_merged_reads_numba(template_ids, reads, 
+                                              template_seqs, chunk_size=300)
+            == phred._process_merged_reads_python(template_ids, reads, 
+                                                  template_seqs))
+
+
+def test_count_phred_occurences(count, tmp_path):
+    rng = np.random.default_rng(1)
+    reads = _random_reads(rng, _random_seqs(rng, 2000, 2, 150))
+    fastq_path = tmp_path / "reads.fq"
+    _write_fastq(fastq_path, reads)
+    counts = count._count_phred_occurences_python(fastq_path)
+    assert count._count_phred_occurences_numba(fastq_path, 300) == counts
+    assert sum(counts) == sum(len(read['quality']) for read in reads)
+
+
+def test_count_phred_occurences_bounds(count, tmp_path):
+    # phred scores 0, 2 and 41
+    fastq_path = tmp_path / "reads.fq"
+    _write_fastq(fastq_path, [{'sequence': b"ACG", 'quality': b"!#J"}])
+    counts = count._count_phred_occurences_python(fastq_path)
+    assert count._count_phred_occurences_numba(fastq_path) == counts
+    assert counts[0] == counts[2] == counts[41] == 1
+
+
+@pytest.mark.parametrize("quality", [b"! !", b"!K!", b"~!!"])
+def test_count_phred_occurences_out_of_range(count, tmp_path, quality):
+    # phred scores -1, 42 and 93
+    fastq_path = tmp_path / "reads.fq"
+    _write_fastq(fastq_path, [{'sequence': b"ACG", 'quality': quality}])
+    with pytest.raises(ValueError):
+        count._count_phred_occurences_numba(fastq_path)
+    with pytest.raises(ValueError):
+        count._count_phred_occurences_python(fastq_path)